@@ -1,3 +1,7 @@
+import csv  # Library for reading and writing to .csv files
+import numpy as np  # Library for storing whole columns of data as arrays
+
+
 class FSA:
     """A Forward Sortation Area (FSA), a geographic area defined by the first 3 digits of your
     postal code. A lot of COVID-19 data is broken down this way, as it is a nice indicator of your
@@ -32,6 +36,12 @@ class FSA:
     percent_1_dose: float
     percent_2_doses: float
 
+    # No per-instance __dict__, since there can be a lot of these.
+    __slots__ = ('name', 'number_of_restaurants', 'number_of_minor_infractions',
+                 'number_of_significant_infractions', 'number_of_crucial_infractions',
+                 'total_covid_cases_per_100', 'total_covid_hospitalizations_per_1000',
+                 'total_covid_deaths_per_1000', 'population', 'percent_1_dose', 'percent_2_doses')
+
     def __init__(self, fsa_name) -> None:
         self.name = fsa_name
         self.number_of_restaurants = 0
@@ -45,3 +55,208 @@ class FSA:
         self.population = 0
         self.percent_1_dose = 0.0
         self.percent_2_doses = 0.0
+
+
+# The columns of an FSATable, in cleaned_data.csv order, as (attribute name, CSV header, dtype).
+# The attribute names match the ones on the FSA class.
+FSA_COLUMNS = [
+    ('number_of_restaurants', 'Number of Restaurants', np.int64),
+    ('number_of_minor_infractions', 'Number of Minor Infractions', np.int64),
+    ('number_of_significant_infractions', 'Number of Significant Infractions', np.int64),
+    ('number_of_crucial_infractions', 'Number of Crucial Infractions', np.int64),
+    ('total_covid_cases_per_100', 'Total COVID-19 Cases per 100 people', np.float64),
+    ('total_covid_hospitalizations_per_1000', 'Total COVID-19 Hospitalizations per 1000 people',
+     np.float64),
+    ('total_covid_deaths_per_1000', 'Total COVID-19 Deaths per 1000 people', np.float64),
+    ('population', 'Population', np.int64),
+    ('percent_1_dose', 'Percent With At Least 1 Dose', np.float64),
+    ('percent_2_doses', 'Percent With 2 Doses', np.float64),
+]
+
+# Columns that can be suppressed in the source data. In cleaned_data.csv and on FSA objects these
+# are -1.0 when suppressed; in an FSATable they are NaN. Any other float column that is missing
+# (e.g. a '<100%' vaccination cell) is NaN everywhere, and an empty field in cleaned_data.csv, so
+# it can never be mistaken for a real -1.0.
+SUPPRESSIBLE_COLUMNS = ('total_covid_cases_per_100', 'total_covid_hospitalizations_per_1000',
+                        'total_covid_deaths_per_1000')
+
+SUPPRESSED = -1.0
+
+
+def _per(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """
+    Divides two columns, giving NaN instead of a warning wherever the denominator is 0.
+    """
+    numerator = numerator.astype(np.float64)
+    denominator = denominator.astype(np.float64)
+    result = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+
+# Columns worked out from other columns, rather than stored. Each maps to a function taking the
+# table and returning the new column.
+DERIVED_COLUMNS = {
+    'total_infractions': lambda table: (table['number_of_minor_infractions']
+                                        + table['number_of_significant_infractions']
+                                        + table['number_of_crucial_infractions']),
+    'restaurant_density': lambda table: _per(table['number_of_restaurants'],
+                                             table['population']),
+    'infractions_per_restaurant': lambda table: _per(table['total_infractions'],
+                                                     table['number_of_restaurants']),
+}
+
+
+class FSATable:
+    """
+    All the data for a whole set of FSAs, stored column by column: one typed NumPy array per
+    metric, with one row per FSA. Suppressed values are NaN instead of -1.0, so they drop out of
+    NumPy's nan-aware functions and masks on their own.
+
+    Columns are accessed by attribute name (table['population']), which also works for the
+    derived columns in DERIVED_COLUMNS. For code that still wants FSA objects, table.fsa(name)
+    and table.to_dict() build them on demand.
+    """
+    # Instance attributes:
+    # - names: The name of the FSA in each row
+    # - columns: Maps each column's attribute name to its array of values
+    # - index: Maps each FSA name to its row number
+    names: np.ndarray
+    columns: dict[str, np.ndarray]
+    index: dict[str, int]
+
+    def __init__(self, names, columns: dict[str, np.ndarray]) -> None:
+        self.names = np.asarray(names, dtype=str)
+        self.columns = {}
+        for column_name, _, dtype in FSA_COLUMNS:
+            column = np.asarray(columns[column_name], dtype=dtype)
+            if column.shape != self.names.shape:
+                raise ValueError(f'Column {column_name} has {column.shape[0]} rows, '
+                                 f'expected {self.names.shape[0]}')
+            self.columns[column_name] = column
+        self.index = {str(name): row for row, name in enumerate(self.names)}
+
+    def __len__(self) -> int:
+        return self.names.shape[0]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def __getitem__(self, column_name: str) -> np.ndarray:
+        if column_name in self.columns:
+            return self.columns[column_name]
+        if column_name in DERIVED_COLUMNS:
+            return DERIVED_COLUMNS[column_name](self)
+        raise KeyError(column_name)
+
+    def masked(self, column_name: str) -> np.ma.MaskedArray:
+        """
+        Returns a column as a masked array, with suppressed (NaN) values masked out.
+        """
+        return np.ma.masked_invalid(self[column_name])
+
+    def unsuppressed(self, *column_names: str) -> np.ndarray:
+        """
+        Returns a boolean mask of the rows where none of the given columns are suppressed.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for column_name in column_names:
+            column = self[column_name]
+            if column.dtype.kind == 'f':
+                mask &= ~np.isnan(column)
+        return mask
+
+    def filter(self, mask: np.ndarray) -> 'FSATable':
+        """
+        Returns a new table with only the rows where mask is True (or the rows at the given
+        indices, if mask is an integer array).
+        """
+        return FSATable(self.names[mask],
+                        {column_name: column[mask] for column_name, column in self.columns.items()})
+
+    def fsa(self, name: str) -> FSA:
+        """
+        Returns an FSA object holding one row of the table. Suppressed values become -1.0 again;
+        other missing values stay NaN.
+        """
+        row = self.index[name]
+        fsa = FSA(name)
+        for column_name, _, dtype in FSA_COLUMNS:
+            value = self.columns[column_name][row]
+            if dtype is np.float64:
+                value = SUPPRESSED if column_name in SUPPRESSIBLE_COLUMNS and np.isnan(value) \
+                    else float(value)
+            else:
+                value = int(value)
+            setattr(fsa, column_name, value)
+        return fsa
+
+    def to_dict(self) -> dict[str, FSA]:
+        """
+        Returns the table as a dict mapping FSA names to FSA objects, the way main.py used to
+        store its data.
+        """
+        return {name: self.fsa(name) for name in self.index}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, FSA]) -> 'FSATable':
+        """
+        Builds a table from a dict mapping FSA names to FSA objects. -1.0 in the suppressible
+        columns becomes NaN.
+        """
+        names = list(data)
+        columns = {}
+        for column_name, _, dtype in FSA_COLUMNS:
+            columns[column_name] = np.array([getattr(data[name], column_name) for name in names],
+                                            dtype=dtype)
+        return cls(names, _suppressed_to_nan(columns))
+
+    @classmethod
+    def from_csv(cls, path: str = 'cleaned_data.csv') -> 'FSATable':
+        """
+        Reads a table from a csv file in the cleaned_data.csv format.
+        """
+        with open(path, newline='') as csv_file:
+            rows = list(csv.reader(csv_file))
+        header, rows = rows[0], [row for row in rows[1:] if len(row) > 0]
+
+        # Look the columns up by header, so extra or reordered columns don't matter.
+        positions = {column_header: i for i, column_header in enumerate(header)}
+        names = [row[positions['FSA']] for row in rows]
+        columns = {}
+        for column_name, column_header, dtype in FSA_COLUMNS:
+            i = positions[column_header]
+            # Parse as floats first, since int() can't handle '0.0'. Empty fields are missing.
+            columns[column_name] = np.array([row[i] if row[i] != '' else 'nan' for row in rows],
+                                            dtype=np.float64).astype(dtype)
+        return cls(names, _suppressed_to_nan(columns))
+
+    def to_csv(self, path: str = 'cleaned_data.csv') -> None:
+        """
+        Writes the table out in the cleaned_data.csv format, with suppressed values as -1.0 and
+        other missing values as empty fields.
+        """
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(['FSA'] + [column_header for _, column_header, _ in FSA_COLUMNS])
+            for name in self.index:
+                fsa = self.fsa(name)
+                writer.writerow([name] + [_csv_field(getattr(fsa, column_name))
+                                          for column_name, _, _ in FSA_COLUMNS])
+
+
+def _csv_field(value) -> object:
+    """
+    Returns a value the way cleaned_data.csv stores it: NaN (missing) as an empty field.
+    """
+    return '' if isinstance(value, float) and np.isnan(value) else value
+
+
+def _suppressed_to_nan(columns: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """
+    Replaces the -1.0 suppression sentinel with NaN in the suppressible columns.
+    """
+    for column_name in SUPPRESSIBLE_COLUMNS:
+        column = columns[column_name]
+        columns[column_name] = np.where(column == SUPPRESSED, np.nan, column)
+    return columns
@@ -0,0 +1,118 @@
+"""
+Fits a straight line and works out correlations for lots of (x metric, y metric) pairs at once.
+
+Instead of running one statsmodels OLS fit per graph, every pair is stacked into one big 2D array
+(one row per pair) and the slope, intercept, r², Pearson and Spearman correlations and their
+p-values are worked out for all of them in one go with NumPy. Suppressed (NaN) values are dropped
+separately for each pair, so a pair only loses the FSAs where one of ITS two metrics is missing.
+"""
+from itertools import product
+import numpy as np  # Library for doing the maths on every pair at once
+import pandas as pd  # Library for handing back the results as a nice table
+from scipy import stats  # Library for turning t statistics into p-values
+from FSA import FSATable, FSA_COLUMNS, DERIVED_COLUMNS
+
+# Every metric that can be compared: the stored columns plus the derived ones.
+METRICS = [column_name for column_name, _, _ in FSA_COLUMNS] + list(DERIVED_COLUMNS)
+
+RESULT_COLUMNS = ['x', 'y', 'n', 'slope', 'intercept', 'r_squared', 'pearson_r', 'pearson_p',
+                  'spearman_rho', 'spearman_p']
+
+
+def metric_pairs(x_metrics: list[str] = None,
+                 y_metrics: list[str] = None) -> list[tuple[str, str]]:
+    """
+    Returns every (x, y) pair from the cross product of x_metrics and y_metrics (all of METRICS if
+    not given), leaving out metrics paired with themselves.
+    """
+    x_metrics = METRICS if x_metrics is None else x_metrics
+    y_metrics = METRICS if y_metrics is None else y_metrics
+    return [(x, y) for x, y in product(x_metrics, y_metrics) if x != y]
+
+
+def _stack(table: FSATable, metrics: list[str]) -> np.ndarray:
+    """
+    Returns a (len(metrics), len(table)) float array with one row per metric. Each distinct
+    metric's column is only fetched (or derived) once.
+    """
+    columns = {metric: table[metric].astype(np.float64) for metric in set(metrics)}
+    return np.vstack([columns[metric] for metric in metrics]) if len(metrics) > 0 \
+        else np.empty((0, len(table)))
+
+
+def fit_rows(x: np.ndarray, y: np.ndarray, valid: np.ndarray) -> tuple[np.ndarray, ...]:
+    """
+    Works out, for every row, the least squares fit and Pearson correlation of y against x,
+    using only the entries where valid is True. Returns (n, slope, intercept, r).
+    """
+    n = valid.sum(axis=1)
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = x.sum(axis=1) / n
+        mean_y = y.sum(axis=1) / n
+        dx = np.where(valid, x - mean_x[:, None], 0.0)
+        dy = np.where(valid, y - mean_y[:, None], 0.0)
+        sxx = (dx * dx).sum(axis=1)
+        syy = (dy * dy).sum(axis=1)
+        sxy = (dx * dy).sum(axis=1)
+
+        slope = np.where(sxx > 0, sxy / sxx, np.nan)
+        intercept = mean_y - slope * mean_x
+        r = np.where((sxx > 0) & (syy > 0), sxy / np.sqrt(sxx * syy), np.nan)
+    return n, slope, intercept, np.clip(r, -1.0, 1.0)
+
+
+def _p_value(r: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """
+    Two-sided p-value for a correlation of r over n points, from the t distribution with n - 2
+    degrees of freedom (the same test scipy.stats.pearsonr and spearmanr use).
+    """
+    degrees = n - 2.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = r * np.sqrt(degrees / ((1.0 - r) * (1.0 + r)))
+        p = 2.0 * stats.t.sf(np.abs(t), degrees)
+    return np.where(degrees > 0, p, np.nan)
+
+
+def _ranks(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """
+    Ranks each row's valid entries (ties get the average rank). Invalid entries are set to +inf
+    first so they rank after all the real values and don't disturb them.
+    """
+    return stats.rankdata(np.where(valid, values, np.inf), axis=1)
+
+
+def correlate(table: FSATable, pairs: list[tuple[str, str]] = None,
+              rank_by: str = 'r_squared') -> pd.DataFrame:
+    """
+    Returns a table with one row per (x metric, y metric) pair in pairs (every pair from
+    metric_pairs() if not given), holding the number of FSAs used, the least squares slope and
+    intercept, r², and Pearson and Spearman correlations with their p-values. Rows are sorted by
+    rank_by, biggest first (or smallest first for p-values).
+    """
+    if pairs is None:
+        pairs = metric_pairs()
+    x = _stack(table, [pair[0] for pair in pairs])
+    y = _stack(table, [pair[1] for pair in pairs])
+    valid = np.isfinite(x) & np.isfinite(y)
+
+    n, slope, intercept, r = fit_rows(x, y, valid)
+    _, _, _, rho = fit_rows(_ranks(x, valid), _ranks(y, valid), valid)
+
+    results = pd.DataFrame({
+        'x': [pair[0] for pair in pairs],
+        'y': [pair[1] for pair in pairs],
+        'n': n,
+        'slope': slope,
+        'intercept': intercept,
+        'r_squared': r * r,
+        'pearson_r': r,
+        'pearson_p': _p_value(r, n),
+        'spearman_rho': rho,
+        'spearman_p': _p_value(rho, n),
+    }, columns=RESULT_COLUMNS)
+
+    ascending = rank_by.endswith('_p')
+    return results.sort_values(rank_by, ascending=ascending, na_position='last',
+                               ignore_index=True)
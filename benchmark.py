@@ -0,0 +1,254 @@
+"""
+Times the whole pipeline (data_prep.py's stages, then main.py's analysis) on made-up data, so its
+performance can be measured without the real files or the five-hour geocoding run. The input
+files come from synthetic_data.py, and geocoding goes to a local stand-in server instead of
+Nominatim (see mock_geocoder.py), so nothing touches the network.
+
+Each scenario is a multiple of Toronto's size (1x is ~17000 establishments, 96 FSAs and the
+~1650-row census), and runs in its own process so its memory numbers aren't muddled by the
+scenario before it. The ICES and census tables only grow until they run out of FSA names
+(synthetic_data.OTHER_FSAS: the census reaches it between 1x and 10x, ICES between 10x and
+100x). Past that only DineSafe gets bigger, since there are only so many FSAs however many
+restaurants there are:
+
+    python benchmark.py                          # 1x, 10x and 100x
+    python benchmark.py --scale 1 --scale 10 --compare
+
+Every run's results (time, CPU, peak memory of the process and of its workers, and throughput of
+every stage, see instrumentation.py) are saved in benchmark_results/, and --compare checks them
+against an earlier run (the latest one by default), listing every stage that got slower by more
+than --threshold.
+Generated files are kept in benchmark_data/ and reused as long as the settings match.
+"""
+import argparse  # Library for reading command line options
+from datetime import datetime, timezone  # Library for timestamping results
+import glob  # Library for finding earlier results
+import json  # Library for saving results
+import os  # Library for working with files and directories
+import platform  # Library for noting what machine the benchmark ran on
+import subprocess  # Library for running each scenario in its own process
+import sys  # Library for finding this Python to run scenarios with
+import synthetic_data
+
+DEFAULT_RESULTS_DIR = 'benchmark_results'
+DEFAULT_DATA_DIR = 'benchmark_data'
+DEFAULT_SCALES = [1, 10, 100]
+
+# Stages that take less time than this are too noisy to call a regression.
+NOISE_SECONDS = 0.05
+
+
+def generate(directory: str, scale: float, infractions_per_establishment: float = 2.0,
+             seed: int = 0) -> None:
+    """
+    Writes every input file for a scenario into directory, unless files made with the same
+    settings are already there.
+    """
+    # Every FSA in the ICES and census files needs its own name, so they stop growing once
+    # synthetic_data runs out of them.
+    ices_rows = min(round(synthetic_data.GRID_COLUMNS * synthetic_data.GRID_ROWS
+                          * (scale - 1)), synthetic_data.OTHER_FSAS)
+    census_rows = min(round(synthetic_data.CENSUS_ROWS * scale), synthetic_data.OTHER_FSAS)
+    settings = {'scale': scale, 'infractions_per_establishment': infractions_per_establishment,
+                'seed': seed, 'ices_rows': ices_rows, 'census_rows': census_rows}
+    settings_path = os.path.join(directory, 'settings.json')
+    if os.path.exists(settings_path):
+        with open(settings_path, encoding='utf-8') as settings_file:
+            if json.load(settings_file) == settings:
+                return
+
+    import data_prep  # The file names data_prep.py expects
+    os.makedirs(directory, exist_ok=True)
+    names = synthetic_data.write_boundaries(os.path.join(directory, data_prep.BOUNDARIES_PATH))
+    synthetic_data.write_dinesafe(os.path.join(directory, data_prep.DINESAFE_PATH),
+                                  round(synthetic_data.TORONTO_ESTABLISHMENTS * scale),
+                                  infractions_per_establishment, seed)
+    synthetic_data.write_ices(os.path.join(directory, data_prep.ICES_PATH), names, ices_rows,
+                              seed)
+    synthetic_data.write_census(os.path.join(directory, data_prep.POPULATION_PATH), names,
+                                census_rows, seed)
+    with open(settings_path, 'w', encoding='utf-8') as settings_file:
+        json.dump(settings, settings_file)
+
+
+def run_scenario(name: str, geocode_latency: float = 0.0, n_resamples: int = 1_000,
+                 geocode_concurrency: int = 32) -> dict:
+    """
+    Runs the whole pipeline on the files in the current directory, timing every stage, and
+    returns the profiler's report. The geocode cache is cleared first, so geocoding is timed too,
+    against a local stand-in server taking geocode_latency seconds per answer.
+    """
+    import data_prep
+    from geocoding import NominatimBackend
+    from mock_geocoder import MockGeocoder
+    from analysis import correlate
+    from figures import FIGURES, figure_pairs, build_figure
+    from instrumentation import Profiler
+    from resampling import resample
+    from snapshot import load_table
+
+    for path in glob.glob('geocode_cache.sqlite*'):
+        os.remove(path)
+
+    profiler = Profiler(name)
+    with profiler.stage('ices') as stage:
+        ices = data_prep.read_ices()
+        stage.add_items(len(ices))
+    with profiler.stage('population') as stage:
+        population = data_prep.read_population()
+        stage.add_items(len(population))
+    with profiler.stage('dinesafe') as stage, MockGeocoder(latency=geocode_latency) as server:
+        backend = NominatimBackend(server.url, rate=10_000, concurrency=geocode_concurrency)
+        dinesafe = data_prep.read_dinesafe(profiler=profiler, backend=backend)
+        stage.add_items(sum(counts[0] for counts in dinesafe.values()))
+        stage.set('input_mb', os.path.getsize(data_prep.DINESAFE_PATH) / (1024 * 1024))
+    with profiler.stage('write') as stage:
+        data = data_prep.build_data(ices, population, dinesafe)
+        data_prep.write_cleaned_data(data)
+        stage.add_items(len(data))
+
+    with profiler.stage('load') as stage:
+        table = load_table(data_prep.CLEANED_DATA_PATH)
+        stage.add_items(len(table))
+    with profiler.stage('correlate') as stage:
+        stage.add_items(len(correlate(table)))
+    with profiler.stage('resample') as stage:
+        stage.add_items(len(resample(table, figure_pairs(), n_resamples=n_resamples)))
+    with profiler.stage('figures') as stage:
+        fits = correlate(table, figure_pairs())
+        for spec in FIGURES.values():
+            fit = fits[(fits['x'] == spec['x']) & (fits['y'] == spec['y'])].iloc[0]
+            build_figure(table, spec, fit)
+            stage.add_items()
+    return profiler.report()
+
+
+def _run_in_subprocess(name: str, directory: str, geocode_latency: float, n_resamples: int,
+                       geocode_concurrency: int) -> dict:
+    """
+    Runs one scenario in a fresh Python process inside directory, and returns its report.
+    """
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--run-scenario', name,
+         '--geocode-latency', str(geocode_latency), '--resamples', str(n_resamples),
+         '--geocode-concurrency', str(geocode_concurrency)],
+        cwd=directory, check=True, stdout=subprocess.PIPE, text=True).stdout
+    # The report is the last line; anything before it is the pipeline's own printing.
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _commit() -> str:
+    """
+    Returns the git commit the code is at, or None if that can't be found out.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], check=True, capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.2) -> tuple[list[str], int]:
+    """
+    Compares every stage of every scenario in two benchmark results. Returns (one line per
+    stage, the number of stages that got more than threshold slower).
+    """
+    lines = [f'{"scenario":<10}{"stage":<18}{"before s":>10}{"after s":>10}{"change":>9}']
+    regressions = 0
+    for scenario, report in current['scenarios'].items():
+        before = {stage['name']: stage
+                  for stage in baseline['scenarios'].get(scenario, {}).get('stages', [])}
+        for stage in report['stages']:
+            if stage['name'] not in before:
+                continue
+            old = before[stage['name']]['wall_seconds']
+            new = stage['wall_seconds']
+            change = (new - old) / old if old > 0 else 0.0
+            flag = ''
+            if change > threshold and new - old > NOISE_SECONDS:
+                flag = '  SLOWER'
+                regressions += 1
+            lines.append(f'{scenario:<10}{stage["name"]:<18}{old:>10.3f}{new:>10.3f}'
+                         f'{change:>+9.0%}{flag}')
+    return lines, regressions
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Time the pipeline on synthetic data.')
+    parser.add_argument('--scale', type=float, action='append', dest='scales',
+                        help='size as a multiple of Toronto (can be given more than once, '
+                             'default 1, 10 and 100)')
+    parser.add_argument('--infractions', type=float, default=2.0,
+                        help='average infractions per establishment')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the data')
+    parser.add_argument('--geocode-latency', type=float, default=0.0,
+                        help='pretend network delay of each geocoding request, in seconds')
+    parser.add_argument('--geocode-concurrency', type=int, default=32,
+                        help='geocoding requests in flight at once')
+    parser.add_argument('--resamples', type=int, default=1_000,
+                        help='bootstrap/permutation resamples per graph')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR,
+                        help='where to keep the generated files')
+    parser.add_argument('--results-dir', default=DEFAULT_RESULTS_DIR,
+                        help='where to save the results')
+    parser.add_argument('--compare', nargs='?', const='latest', default=None, metavar='RESULTS',
+                        help='compare against an earlier results file (default: the latest)')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='how much slower a stage may get before it counts as a regression')
+    parser.add_argument('--run-scenario', help=argparse.SUPPRESS)  # Used by the subprocesses
+    args = parser.parse_args(argv)
+
+    if args.run_scenario is not None:
+        print(json.dumps(run_scenario(args.run_scenario, args.geocode_latency, args.resamples,
+                                      args.geocode_concurrency)))
+        return 0
+
+    earlier = sorted(glob.glob(os.path.join(args.results_dir, '*.json')))
+    started = datetime.now(timezone.utc)
+    results = {'started': started.isoformat(), 'commit': _commit(),
+               'python': platform.python_version(), 'machine': platform.platform(),
+               'cpus': os.cpu_count(), 'infractions_per_establishment': args.infractions,
+               'geocode_latency': args.geocode_latency,
+               'geocode_concurrency': args.geocode_concurrency, 'resamples': args.resamples,
+               'scenarios': {}}
+    for scale in args.scales or DEFAULT_SCALES:
+        name = f'{scale:g}x'
+        directory = os.path.join(args.data_dir, name)
+        print(f'Generating {name} data in {directory}...')
+        generate(directory, scale, args.infractions, args.seed)
+        print(f'Running {name}...')
+        report = _run_in_subprocess(name, directory, args.geocode_latency, args.resamples,
+                                    args.geocode_concurrency)
+        results['scenarios'][name] = report
+        for stage in report['stages']:
+            rate = stage['items_per_second']
+            print(f'  {stage["name"]:<18}{stage["wall_seconds"]:>9.3f}s'
+                  f'{stage["peak_rss_mb"] or 0:>9.0f} MB'
+                  f'{stage.get("children_peak_rss_mb") or 0:>9.0f} MB in workers'
+                  f'{rate if rate is not None else 0:>12.0f} items/s')
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, started.strftime('%Y%m%dT%H%M%SZ') + '.json')
+    with open(path, 'w', encoding='utf-8') as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f'Results saved to {path}')
+
+    if args.compare is not None:
+        baseline_path = args.compare if args.compare != 'latest' else \
+            (earlier[-1] if len(earlier) > 0 else None)
+        if baseline_path is None:
+            print('No earlier results to compare against')
+            return 0
+        with open(baseline_path, encoding='utf-8') as baseline_file:
+            lines, regressions = compare(results, json.load(baseline_file), args.threshold)
+        print(f'Compared with {baseline_path}:')
+        print('\n'.join(lines))
+        if regressions > 0:
+            print(f'{regressions} stages got more than {args.threshold:.0%} slower')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
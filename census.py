@@ -0,0 +1,221 @@
+"""
+A persisted index of the census file (T120120211212055123.CSV), so picking out the population of a
+handful of FSAs doesn't mean scanning all ~1650 rows of the national file every time, once per
+region.
+
+The index is a directory next to the csv (T120120211212055123.index) holding one .npy file per
+column, sorted by FSA name, plus a meta.json. Loading it memory-maps the columns, and looking up k
+FSAs is a binary search for each of them, without touching the csv or building anything over the
+whole country. The rows of each province are listed too, so a whole province is one slice.
+
+meta.json records the size, modification time and SHA-256 hash of the csv (see
+stage_cache.is_fresh), and the index is only rebuilt when the csv's contents change.
+"""
+import csv  # Library for reading the census file when (re)building the index
+import json  # Library for reading meta.json
+import os  # Library for working with files and directories
+import re  # Library for telling FSA rows apart from the rest
+import numpy as np  # Library for saving and memory-mapping the columns
+from stage_cache import invalidate, is_fresh, source_info, write_json
+
+DEFAULT_CENSUS_PATH = 'T120120211212055123.CSV'
+
+# Bump this whenever the layout of an index changes, so old indexes get rebuilt.
+INDEX_VERSION = 1
+
+# The numeric columns kept for every FSA, mapped to their position in the csv.
+CENSUS_COLUMNS = {
+    'population': 4,
+    'dwellings': 5,  # Total private dwellings
+    'occupied_dwellings': 6,  # Private dwellings occupied by usual residents
+}
+
+# What an FSA name looks like: letter, digit, letter. Skips the row for Canada as a whole.
+_FSA_PATTERN = re.compile(r'^[A-Z]\d[A-Z]$')
+
+
+class CensusIndex:
+    """
+    The census numbers for every FSA, sorted by FSA name, with the rows of each province listed
+    separately.
+    """
+    # Instance attributes:
+    # - names: The FSA names, sorted
+    # - provinces: The province or territory of each FSA
+    # - columns: Maps each entry of CENSUS_COLUMNS to an int array lined up with names
+    # - province_rows: Maps each province to the (sorted) rows of its FSAs
+    names: np.ndarray
+    provinces: np.ndarray
+    columns: dict[str, np.ndarray]
+    province_rows: dict[str, np.ndarray]
+
+    def __init__(self, names: np.ndarray, provinces: np.ndarray, columns: dict[str, np.ndarray],
+                 province_rows: dict[str, np.ndarray] = None) -> None:
+        self.names = names
+        self.provinces = provinces
+        self.columns = columns
+        if province_rows is None:
+            province_rows = {str(province): np.flatnonzero(provinces == province)
+                             for province in np.unique(provinces)}
+        self.province_rows = province_rows
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def rows(self, fsas) -> np.ndarray:
+        """
+        Returns the row of each FSA in fsas, or -1 for FSAs that aren't in the census.
+        """
+        fsas = np.asarray(list(fsas), dtype=self.names.dtype if len(self.names) > 0 else str)
+        if len(self.names) == 0 or len(fsas) == 0:
+            return np.full(len(fsas), -1, dtype=np.int64)
+        rows = np.searchsorted(self.names, fsas)
+        rows = np.minimum(rows, len(self.names) - 1)
+        return np.where(self.names[rows] == fsas, rows, -1)
+
+    def fetch(self, fsas, column: str = 'population', missing: int = 0) -> np.ndarray:
+        """
+        Returns a column for each FSA in fsas, in the same order, with missing for FSAs that
+        aren't in the census.
+        """
+        rows = self.rows(fsas)
+        values = np.asarray(self.columns[column])[np.maximum(rows, 0)]
+        return np.where(rows >= 0, values, missing)
+
+    def lookup(self, fsas, column: str = 'population') -> dict[str, int]:
+        """
+        Returns a dict mapping each FSA in fsas that is in the census to its value in column.
+        """
+        fsas = list(fsas)
+        rows = self.rows(fsas)
+        values = self.columns[column]
+        return {fsa: int(values[row]) for fsa, row in zip(fsas, rows) if row >= 0}
+
+    def in_province(self, province: str) -> np.ndarray:
+        """
+        Returns the names of every FSA in a province or territory, e.g. 'Ontario'.
+        """
+        return self.names[self.province_rows.get(province, np.empty(0, dtype=np.int64))]
+
+    def to_dict(self, column: str = 'population') -> dict[str, int]:
+        """
+        Returns a dict mapping every FSA in the census to its value in column.
+        """
+        return {str(name): int(value) for name, value in zip(self.names, self.columns[column])}
+
+    @classmethod
+    def from_csv(cls, path: str = DEFAULT_CENSUS_PATH) -> 'CensusIndex':
+        """
+        Reads the census csv. Only rows with an FSA name are kept.
+        """
+        names = []
+        provinces = []
+        values = {column: [] for column in CENSUS_COLUMNS}
+        # The footnotes at the bottom of the file aren't valid UTF-8, so read it as Latin-1.
+        with open(path, newline='', encoding='latin-1') as census_csv:
+            census_reader = csv.reader(census_csv, delimiter=',')
+            next(census_reader)  # Skip the header row
+            for row in census_reader:
+                if len(row) == 0:  # Only happens at the end of the data, before the footnotes
+                    break
+                if _FSA_PATTERN.match(row[0]) is None:
+                    continue
+                names.append(row[0])
+                provinces.append(row[2])
+                for column, position in CENSUS_COLUMNS.items():
+                    values[column].append(int(row[position]) if row[position].isdigit() else 0)
+
+        order = np.argsort(names, kind='stable')
+        return cls(np.array(names, dtype=str)[order], np.array(provinces, dtype=str)[order],
+                   {column: np.array(column_values, dtype=np.int64)[order]
+                    for column, column_values in values.items()})
+
+
+def index_path(census_path: str) -> str:
+    """
+    Returns where the index of the census csv at census_path lives.
+    """
+    return os.path.splitext(census_path)[0] + '.index'
+
+
+def write_index(index: CensusIndex, census_path: str = DEFAULT_CENSUS_PATH,
+                directory: str = None) -> None:
+    """
+    Writes index to disk, recording that it was built from the csv at census_path.
+    """
+    if directory is None:
+        directory = index_path(census_path)
+    os.makedirs(directory, exist_ok=True)
+
+    meta_path = os.path.join(directory, 'meta.json')
+    invalidate(meta_path)
+
+    np.save(os.path.join(directory, 'names.npy'), index.names)
+    np.save(os.path.join(directory, 'provinces.npy'), index.provinces)
+    for column in CENSUS_COLUMNS:
+        np.save(os.path.join(directory, column + '.npy'), index.columns[column])
+
+    # Every province's rows, one after the other, with where each one starts and ends kept in
+    # meta.json, so loading doesn't have to group the whole country again.
+    province_spans = {}
+    start = 0
+    for province, rows in index.province_rows.items():
+        province_spans[province] = [start, start + len(rows)]
+        start += len(rows)
+    province_order = np.concatenate([np.empty(0, dtype=np.int64)] +
+                                    [np.asarray(rows) for rows in index.province_rows.values()])
+    np.save(os.path.join(directory, 'province_rows.npy'), province_order)
+
+    meta = {'index_version': INDEX_VERSION,
+            'source': source_info(census_path),
+            'rows': len(index),
+            'columns': list(CENSUS_COLUMNS),
+            'provinces': province_spans}
+    write_json(meta_path, meta)
+
+
+def read_index(census_path: str = DEFAULT_CENSUS_PATH, directory: str = None) -> CensusIndex:
+    """
+    Returns the stored index of the census csv at census_path, memory-mapped, or None if there is
+    no index or the csv has changed since it was built.
+    """
+    if directory is None:
+        directory = index_path(census_path)
+    meta_path = os.path.join(directory, 'meta.json')
+    if not os.path.exists(meta_path) or not os.path.exists(census_path):
+        return None
+
+    with open(meta_path, encoding='utf-8') as meta_file:
+        meta = json.load(meta_file)
+    if meta.get('index_version') != INDEX_VERSION or meta['columns'] != list(CENSUS_COLUMNS):
+        return None
+
+    if not is_fresh(meta, census_path, meta_path):
+        return None
+
+    names = np.load(os.path.join(directory, 'names.npy'), mmap_mode='r')
+    provinces = np.load(os.path.join(directory, 'provinces.npy'), mmap_mode='r')
+    columns = {column: np.load(os.path.join(directory, column + '.npy'), mmap_mode='r')
+               for column in meta['columns']}
+    province_order = np.load(os.path.join(directory, 'province_rows.npy'), mmap_mode='r')
+    province_rows = {province: province_order[start:end]
+                     for province, (start, end) in meta['provinces'].items()}
+    return CensusIndex(names, provinces, columns, province_rows)
+
+
+def load_census(census_path: str = DEFAULT_CENSUS_PATH, refresh: bool = True) -> CensusIndex:
+    """
+    Returns the index of the census csv at census_path, rebuilding it from the csv only if it is
+    missing or the csv's contents changed. With refresh, a rebuilt index is saved for next time.
+    """
+    index = read_index(census_path)
+    if index is not None:
+        return index
+
+    index = CensusIndex.from_csv(census_path)
+    if refresh:
+        try:
+            write_index(index, census_path)
+        except OSError:
+            pass  # A read-only directory just means rebuilding from the csv every time.
+    return index
@@ -0,0 +1,353 @@
+"""
+A map of every FSA, coloured by any metric (cases, restaurants, infractions, vaccination, ...),
+with buttons to switch between metrics. Writes a single HTML page that works offline:
+
+    python dashboard.py                        # Toronto, from cleaned_data.csv
+    python dashboard.py --all-fsas --detail coarse   # every FSA in the boundary file
+
+The boundary polygons (see fsa_resolver.py) are far more detailed than a map on a screen needs,
+so they are simplified with the Douglas-Peucker algorithm and the result cached as GeoJSON in
+.dashboard_cache, only being redone when the boundary file changes. There are a few levels of
+detail to pick from (DETAIL_LEVELS, --detail), but a page only ever holds the one it was written
+with, and only that level is worked out. Switching level as the map is zoomed would mean
+embedding every level and swapping geometry on each plotly relayout, which would multiply the
+page's size for little gain on a static page, so it is deliberately left out: pick a coarser
+level for the whole country and a finer one for a city. The geometry goes into the page exactly
+once. Every metric's values are worked out up
+front as one array lined up with the FSAs, and switching metrics only swaps the colour values
+(a plotly restyle of z), so the geometry is never sent or drawn again.
+"""
+import argparse  # Library for reading command line options
+import json  # Library for reading and writing GeoJSON
+import os  # Library for working with files and directories
+import numpy as np  # Library for the simplification maths and the metric arrays
+import plotly.graph_objects as go  # Library for drawing the map
+from analysis import METRICS
+from FSA import FSATable, FSA_COLUMNS
+from fsa_resolver import NAME_PROPERTIES
+from snapshot import load_table
+from stage_cache import invalidate, is_fresh, source_info, write_json
+
+DEFAULT_BOUNDARIES_PATH = 'fsa_boundaries.geojson'
+DEFAULT_CACHE_DIR = '.dashboard_cache'
+DEFAULT_OUTPUT_DIR = 'dashboard'
+
+# How far (in degrees) a simplified outline may stray from the real one at each level of detail.
+# 0.0005 degrees is about 50 m; 0.01 is about 1 km, plenty for the whole country on one screen.
+DETAIL_LEVELS = {'fine': 0.0005, 'medium': 0.002, 'coarse': 0.01}
+
+# Bump this whenever the way outlines are simplified changes, so old cached GeoJSON is redone.
+GEOMETRY_VERSION = 2
+
+# Readable names for the metrics, for the buttons and the colour bar.
+METRIC_LABELS = {column_name: header for column_name, header, _ in FSA_COLUMNS}
+METRIC_LABELS.update({'total_infractions': 'Total Infractions',
+                      'restaurant_density': 'Restaurants per Person',
+                      'infractions_per_restaurant': 'Infractions per Restaurant',
+                      'dwellings': 'Total Private Dwellings',
+                      'occupied_dwellings': 'Occupied Private Dwellings'})
+
+
+def simplify_lines(points: np.ndarray, starts: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Douglas-Peucker for many lines at once. points holds every line one after the other, and
+    starts says where each one begins. Returns a boolean mask of the points kept: both ends of
+    every line, and every point needed to keep each line within tolerance of the original.
+
+    Instead of recursing into one span at a time, every span between two kept points (in every
+    line) is split in the same pass: each point's distance to its own span's chord is worked out
+    all at once, the farthest point of every span is found with one reduceat, and spans whose
+    farthest point is within tolerance are finished. So a pass costs a few NumPy calls however
+    many spans and lines there are, and there are only as many passes as the recursion would be
+    deep. The gap from one line's end to the next line's start is never a span, since the two
+    points are next to each other.
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    keep[starts] = True
+    keep[np.append(starts[1:], len(points)) - 1] = True
+    open_spans = np.ones(len(points), dtype=bool)  # Indexed by each span's first point
+    while True:
+        kept = np.flatnonzero(keep)
+        firsts = kept[:-1]
+        lasts = kept[1:]
+        active = open_spans[firsts] & (lasts - firsts >= 2)
+        if not active.any():
+            return keep
+        open_spans[firsts[~active]] = False
+        firsts = firsts[active]
+        lasts = lasts[active]
+
+        # Every point strictly inside an active span, and which span it belongs to.
+        lengths = lasts - firsts - 1
+        span_starts = np.cumsum(lengths) - lengths
+        span_of = np.repeat(np.arange(len(firsts)), lengths)
+        inside = np.arange(lengths.sum()) - span_starts[span_of] + firsts[span_of] + 1
+
+        # Distance from each point to its span's chord (the segment, not the infinite line).
+        start = points[firsts][span_of]
+        direction = points[lasts][span_of] - start
+        offset = points[inside] - start
+        length_squared = np.einsum('ij,ij->i', direction, direction)
+        along = np.clip(np.einsum('ij,ij->i', offset, direction)
+                        / np.where(length_squared > 0, length_squared, 1), 0, 1)
+        distances = np.hypot(*(offset - along[:, None] * direction).T)
+
+        # The farthest point of each span: its maximum, then the first point that reaches it.
+        farthest = np.maximum.reduceat(distances, span_starts)
+        is_farthest = distances == farthest[span_of]
+        first_farthest = np.full(len(firsts), len(distances))
+        np.minimum.at(first_farthest, span_of[is_farthest], np.flatnonzero(is_farthest))
+
+        split = farthest > tolerance
+        keep[inside[first_farthest[split]]] = True
+        open_spans[firsts[~split]] = False
+
+
+def simplify_rings(rings: list, tolerance: float) -> list[np.ndarray]:
+    """
+    Returns every ring in rings simplified with Douglas-Peucker, closed (first point repeated at
+    the end), or None for rings that shrink to less than a triangle. A closed ring has no chord
+    to measure against, so each one is split at the point farthest from its start, and the two
+    halves are simplified as separate lines. All the halves of all the rings go through
+    simplify_lines together.
+    """
+    closed_rings = []  # (closed ring, where it was split), or None for degenerate rings
+    halves = []
+    for ring in rings:
+        ring = np.asarray(ring, dtype=np.float64)[:, :2]
+        if len(ring) > 1 and np.array_equal(ring[0], ring[-1]):
+            ring = ring[:-1]
+        if len(ring) < 3:
+            closed_rings.append(None)
+            continue
+        split = int(np.argmax(np.hypot(*(ring - ring[0]).T)))
+        closed = np.vstack([ring, ring[:1]])
+        closed_rings.append((closed, split))
+        halves.extend([closed[:split + 1], closed[split:]])
+    if len(halves) == 0:
+        return [None] * len(closed_rings)
+
+    lengths = np.array([len(half) for half in halves])
+    keep = simplify_lines(np.vstack(halves), np.cumsum(lengths) - lengths, tolerance)
+
+    simplified = []
+    position = 0
+    for entry in closed_rings:
+        if entry is None:
+            simplified.append(None)
+            continue
+        closed, split = entry
+        ring_keep = np.zeros(len(closed), dtype=bool)
+        ring_keep[:split + 1] |= keep[position:position + split + 1]
+        position += split + 1
+        ring_keep[split:] |= keep[position:position + len(closed) - split]
+        position += len(closed) - split
+        result = closed[ring_keep]
+        simplified.append(result if len(result) >= 4 else None)  # 3 corners + closing point
+    return simplified
+
+
+def simplify_geometries(geometries: list[dict], tolerance: float,
+                        digits: int = 5) -> list[dict]:
+    """
+    Returns every Polygon/MultiPolygon GeoJSON geometry with its rings simplified, and coordinates
+    rounded to digits decimal places (5 is about a metre). Rings that shrink away are dropped,
+    except that every polygon keeps its outer ring, so no FSA ever disappears from the map.
+    """
+    polygons_of = [[geometry['coordinates']] if geometry['type'] == 'Polygon'
+                   else geometry['coordinates'] for geometry in geometries]
+    rings = [ring for polygons in polygons_of for polygon in polygons for ring in polygon]
+    simplified_rings = iter(simplify_rings(rings, tolerance))
+
+    results = []
+    for geometry, polygons in zip(geometries, polygons_of):
+        simplified = []
+        for polygon in polygons:
+            kept = []
+            for position, ring in enumerate(polygon):
+                result = next(simplified_rings)
+                if result is None and position == 0:
+                    # Too small to simplify at this level; keep its outline as it was.
+                    result = np.asarray(ring, dtype=np.float64)[:, :2]
+                if result is not None:
+                    kept.append(np.round(result, digits).tolist())
+            if len(kept) > 0:
+                simplified.append(kept)
+        if geometry['type'] == 'Polygon':
+            results.append({'type': 'Polygon', 'coordinates': simplified[0] if simplified else []})
+        else:
+            results.append({'type': 'MultiPolygon', 'coordinates': simplified})
+    return results
+
+
+def _feature_name(properties: dict) -> str:
+    return str(next(properties[key] for key in NAME_PROPERTIES if key in properties))
+
+
+def build_geometry(detail: str, boundaries_path: str = DEFAULT_BOUNDARIES_PATH,
+                   cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    """
+    Makes sure there is a copy of the boundary file simplified to one level of DETAIL_LEVELS, and
+    returns the path of its GeoJSON. Each level is cached in its own folder with its own
+    meta.json, and is only rebuilt if the boundary file, the level's tolerance or
+    GEOMETRY_VERSION changed since it was last built, so levels nobody asks for are never worked
+    out.
+
+    Each feature gets its FSA name as its id, and nothing else in its properties, to keep the
+    files (and the pages they end up in) small.
+    """
+    tolerance = DETAIL_LEVELS[detail]
+    directory = os.path.join(cache_dir, detail)
+    path = os.path.join(directory, 'outlines.geojson')
+    meta_path = os.path.join(directory, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding='utf-8') as meta_file:
+            previous = json.load(meta_file)
+        if previous.get('version') == GEOMETRY_VERSION \
+                and previous.get('tolerance') == tolerance \
+                and os.path.exists(path) \
+                and is_fresh(previous, boundaries_path, meta_path):
+            return path
+
+    # Taken before reading the file, so a change made while simplifying gets noticed next time.
+    meta = {'version': GEOMETRY_VERSION, 'tolerance': tolerance,
+            'source': source_info(boundaries_path)}
+    with open(boundaries_path, encoding='utf-8') as boundaries_file:
+        collection = json.load(boundaries_file)
+    features = [(_feature_name(feature.get('properties') or {}), feature['geometry'])
+                for feature in collection['features']
+                if feature['geometry']['type'] in ('Polygon', 'MultiPolygon')]
+
+    os.makedirs(directory, exist_ok=True)
+    invalidate(meta_path)
+    geometries = simplify_geometries([geometry for _, geometry in features], tolerance)
+    simplified = {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'id': name, 'properties': {}, 'geometry': geometry}
+        for (name, _), geometry in zip(features, geometries)]}
+    with open(path, 'w', encoding='utf-8') as geometry_file:
+        # No spaces after separators: they add up over millions of coordinates. dumps rather than
+        # dump, since dump goes through the (much slower) pure Python encoder.
+        geometry_file.write(json.dumps(simplified, separators=(',', ':')))
+    write_json(meta_path, meta)
+    return path
+
+
+def metric_arrays(table: FSATable, names: list[str], metrics: list[str] = None,
+                  census=None) -> dict[str, np.ndarray]:
+    """
+    Returns {metric: float array lined up with names}, with NaN for FSAs that aren't in the table
+    (or are suppressed). With a census index (see census.py), dwelling counts are added, and
+    population is filled in for FSAs outside the table too.
+    """
+    metrics = METRICS if metrics is None else metrics
+    row_of = {str(name): row for row, name in enumerate(table.names)}
+    rows = np.array([row_of.get(name, -1) for name in names], dtype=np.int64)
+    found = rows >= 0
+
+    arrays = {}
+    for metric in metrics:
+        values = np.full(len(names), np.nan)
+        values[found] = table[metric].astype(np.float64)[rows[found]]
+        arrays[metric] = values
+    if census is not None:
+        census_population = census.fetch(names, 'population', missing=-1).astype(np.float64)
+        arrays['population'] = np.where(found, arrays.get('population', np.nan),
+                                        census_population)
+        arrays['population'][arrays['population'] < 0] = np.nan
+        for column in ('dwellings', 'occupied_dwellings'):
+            values = census.fetch(names, column, missing=-1).astype(np.float64)
+            arrays[column] = np.where(values >= 0, values, np.nan)
+    return arrays
+
+
+def _plain(values: np.ndarray) -> list:
+    """
+    Returns an array as a list json can write, with NaN as None (a blank FSA on the map).
+    """
+    return [None if np.isnan(value) else float(value) for value in values]
+
+
+def build_dashboard(geometry: dict, names: list[str], arrays: dict[str, np.ndarray],
+                    initial: str = None) -> go.Figure:
+    """
+    Returns the map, showing initial (the first metric by default), with a button per metric.
+    Each button only restyles z (and the colour range and title), never the geometry.
+    """
+    initial = initial or next(iter(arrays))
+    figure = go.Figure(go.Choropleth(
+        geojson=geometry, featureidkey='id', locations=names, z=_plain(arrays[initial]),
+        colorscale='Viridis', marker_line_width=0.2, marker_line_color='white',
+        colorbar_title_text=METRIC_LABELS.get(initial, initial),
+        hovertemplate='%{location}: %{z:,.3~f}<extra></extra>'))
+
+    buttons = []
+    for metric, values in arrays.items():
+        known = values[~np.isnan(values)]
+        low, high = (float(known.min()), float(known.max())) if len(known) > 0 else (0.0, 1.0)
+        label = METRIC_LABELS.get(metric, metric)
+        buttons.append({'label': label, 'method': 'restyle',
+                        'args': [{'z': [_plain(values)], 'zmin': [low], 'zmax': [high],
+                                  'colorbar.title.text': [label]}]})
+    figure.update_layout(
+        updatemenus=[{'buttons': buttons, 'direction': 'down', 'x': 0.01, 'y': 0.99,
+                      'xanchor': 'left', 'yanchor': 'top',
+                      'active': list(arrays).index(initial)}],
+        margin={'l': 0, 'r': 0, 't': 40, 'b': 0}, title='FSA metrics')
+    # No map tiles: the FSAs are the map, so it works offline and draws fast.
+    figure.update_geos(fitbounds='locations', visible=False)
+    return figure
+
+
+def write_dashboard(output_dir: str = DEFAULT_OUTPUT_DIR, source_path: str = 'cleaned_data.csv',
+                    boundaries_path: str = DEFAULT_BOUNDARIES_PATH, detail: str = None,
+                    all_fsas: bool = False, census_path: str = None,
+                    cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    """
+    Writes the dashboard to output_dir/index.html (with plotly.js next to it), and returns its
+    path. Only the FSAs in the data are drawn, unless all_fsas is set, in which case every FSA in
+    the boundary file is (blank where there's no data). detail is a key of DETAIL_LEVELS; by
+    default 'fine' for just the data's FSAs and 'coarse' for all of them.
+    """
+    detail = detail or ('coarse' if all_fsas else 'fine')
+    with open(build_geometry(detail, boundaries_path, cache_dir), encoding='utf-8') \
+            as geometry_file:
+        geometry = json.load(geometry_file)
+
+    table = load_table(source_path)
+    wanted = None if all_fsas else {str(name) for name in table.names}
+    geometry['features'] = [feature for feature in geometry['features']
+                            if wanted is None or feature['id'] in wanted]
+    names = [feature['id'] for feature in geometry['features']]
+
+    census = None
+    if census_path is not None:
+        from census import load_census
+        census = load_census(census_path)
+    figure = build_dashboard(geometry, names, metric_arrays(table, names, census=census),
+                             initial='total_covid_cases_per_100')
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, 'index.html')
+    figure.write_html(path, include_plotlyjs='directory', full_html=True)
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a map of every FSA, coloured by any '
+                                                 'metric.')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR,
+                        help='where to write index.html')
+    parser.add_argument('--data', default='cleaned_data.csv', help='the cleaned data csv')
+    parser.add_argument('--boundaries', default=DEFAULT_BOUNDARIES_PATH,
+                        help='FSA boundary GeoJSON file')
+    parser.add_argument('--detail', choices=list(DETAIL_LEVELS),
+                        help='how much detail the outlines keep')
+    parser.add_argument('--all-fsas', action='store_true',
+                        help='draw every FSA in the boundary file, not just the ones in the data')
+    parser.add_argument('--census', default=None,
+                        help='census csv, for population and dwellings outside the data')
+    args = parser.parse_args()
+
+    path = write_dashboard(args.output_dir, args.data, args.boundaries, args.detail,
+                           args.all_fsas, args.census)
+    print(f'Dashboard written to {path}')
@@ -1,219 +1,360 @@
 """
 *******IMPORTANT*******
 The purpose of this file is to collect and collate data from the various datasets, process it into
-a useful form, then finally store it in the cleaned_data.csv file. TO DO THIS, IT PINGS A GEOLOCATOR
-API WITH COORDINATES USED IN DATA GATHERING. THIS PROCESS WILL TAKE OVER FIVE (5) HOURS. UNLESS YOU
-ARE OK WITH THAT, DO NOT RUN THIS FILE.
+a useful form, then finally store it in the cleaned_data.csv file. TO DO THIS, IT NEEDS THE FSA OF
+EVERY RESTAURANT. If the FSA boundary file (fsa_boundaries.geojson, see fsa_resolver.py) is present,
+this is worked out locally in seconds. WITHOUT IT, THIS FILE PINGS A GEOLOCATOR API WITH EVERY
+COORDINATE AND WILL TAKE OVER FIVE (5) HOURS. UNLESS YOU ARE OK WITH THAT, GET THE BOUNDARY FILE
+FIRST.
 
 Data set notes:
 - ds.xml is the DineSafe dataset, detailing all restaurants in the city by address and infractions
 - ICES-COVID19-Vaccination-Data-by-FSA.xlsx is a spreadsheet detailing COVID-19 cases,
 hospitalizations and deaths per population, as well as what percent of people have recieved at least
 1, 2 and 3 doses of vaccine. Some data values are suppressed to prevent identifiability.
-- T120120211212055123.csv details the population of each FSA.
-"""
-from geopy.geocoders import Nominatim  # Library for pinging Nominatim geolocator API
-import openpyxl  # Library for reading data from excel spreadsheet
-import csv  # Library for reading and writing to .csv files
-from xml.dom import minidom  # Library for reading .xml files
-import unidecode  # Library for getting rid of weird unicode characters in the aformentioned
-# .xml files that were breaking my reader
-from geopy.extra.rate_limiter import RateLimiter  # Library for ratelimiting my pings to the
-# Nominatim geolocator API, which allows a maximum of one request per second.
-from FSA import FSA  # My FSA data class, which allows me to create FSA (forward sortation area
-# objects I use to store data)
-
-# data dict maps FSA names to FSA data types. Easiest way to store and access info while the data
-# is processed for all 96 Toronto FSAs.
-data = {}
-
-# First data batch: the Institude for Clinical Evaluative Studies (an Ontario health data research
-# centre)'s COVID-19 vaccination data spreadsheet.
-path = 'ICES-COVID19-Vaccination-Data-by-FSA.xlsx'
-ICES_wb_obj = openpyxl.load_workbook(path)
-ICES_1_dose_sheet_obj = ICES_wb_obj['At least 1 Dose  by FSA']
-
-
-sheet_row = 272  # First row containing Toronto-relevant data
-while sheet_row <= 367:  # Passing through all Toronto postal codes in the data set.
-    FSA_cell = ICES_1_dose_sheet_obj.cell(row=sheet_row, column=1)
-    cases_per_100_cell = ICES_1_dose_sheet_obj.cell(row=sheet_row, column=3)
-    hospitalizations_per_1000_cell = ICES_1_dose_sheet_obj.cell(row=sheet_row, column=4)
-    deaths_per_1000_cell = ICES_1_dose_sheet_obj.cell(row=sheet_row, column=5)
-    percent_1_dose_cell = ICES_1_dose_sheet_obj.cell(row=sheet_row, column=6)
-
-    FSA_name = FSA_cell.value
-
-    data[FSA_name] = FSA(FSA_name)
-
-    # Checks if data value is suppressed to prevent assignment errors. If it is suppressed, the
-    # value will remain at the default value of -1. This can be easily detected and removed
-    # from data comparisons later.
-    if cases_per_100_cell.value != '*':
-        data[FSA_name].total_covid_cases_per_100 = cases_per_100_cell.value
-
-    if hospitalizations_per_1000_cell.value != '*':
-        data[FSA_name].total_covid_hospitalizations_per_1000 = hospitalizations_per_1000_cell.value
-
-    if deaths_per_1000_cell.value != '*':
-        data[FSA_name].total_covid_deaths_per_1000 = deaths_per_1000_cell.value
-
-    data[FSA_name].percent_1_dose = percent_1_dose_cell.value
-
-    sheet_row += 1
-
-# Data now contains:
-# Cases
-# Hospitalizations
-# Deaths
-# 1-dose vaccinations
-# for all Toronto postal codes! Awesome!
-
-# Here, we add the 2-dose vaccination rate
-ICES_2_dose_sheet_obj = ICES_wb_obj['2 doses by FSA']
-
-sheet_row = 277
-while sheet_row <= 372:
-    FSA_cell = ICES_2_dose_sheet_obj.cell(row=sheet_row, column=1)
-    percent_2_doses_cell = ICES_2_dose_sheet_obj.cell(row=sheet_row, column=3)
-
-    data[FSA_cell.value].percent_2_doses = percent_2_doses_cell.value
-
-    sheet_row += 1
+- T120120211212055123.CSV details the population of each FSA.
+- fsa_boundaries.geojson (optional, not included) holds the boundary polygon of each FSA.
 
+Each data set is handled by its own stage. Every stage remembers a fingerprint of its input files
+and its result (see stage_cache.py), so rerunning this file only redoes the stages whose input
+files actually changed. If nothing changed, it finishes almost instantly.
+"""
+import numpy as np  # Library for working with the columns ices.py hands back
+from geocoding import Backend, reverse_geocode  # Asks Nominatim (or another geocoder) for
+# postcodes, many at once, without going over the geocoder's rate limit.
+from FSA import FSA, FSATable  # My FSA data class, which allows me to create FSA (forward
+# sortation area objects I use to store data), and the table that holds a whole set of them
+from fsa_resolver import FSAResolver  # Finds the FSA of coordinates locally, without Nominatim
+import os  # Library for checking whether files exist
+from dinesafe import iter_establishments  # Streams establishments out of the ds.xml file
+from dinesafe_aggregate import aggregate  # Counts up ds.xml on every core at once
+from geocode_cache import GeocodeCache  # Remembers Nominatim's answers between runs
+from stage_cache import Incomplete, run_stage  # Skips stages whose input files haven't changed
+from ices import read_ices_workbook  # Pulls the columns we want out of the ICES workbook
+from census import load_census  # Looks up census numbers by FSA without rereading the csv
+from snapshot import write_snapshot  # Saves a fast-loading binary copy of cleaned_data.csv
+from instrumentation import Profiler, StageRecord  # Times each stage and writes a report
+from contextlib import nullcontext  # Stands in for a profiler stage when there's no profiler
+
+ICES_PATH = 'ICES-COVID19-Vaccination-Data-by-FSA.xlsx'
+# I have absolutely no idea why the file is called that. It just is.
+POPULATION_PATH = 'T120120211212055123.CSV'
+DINESAFE_PATH = 'ds.xml'
+BOUNDARIES_PATH = 'fsa_boundaries.geojson'
+CLEANED_DATA_PATH = 'cleaned_data.csv'
+
+
+def read_ices(path: str = ICES_PATH) -> dict[str, list]:
+    """
+    First data batch: the Institude for Clinical Evaluative Studies (an Ontario health data
+    research centre)'s COVID-19 vaccination data spreadsheet. Returns a dict mapping each Toronto
+    FSA to [cases per 100, hospitalizations per 1000, deaths per 1000, percent 1 dose,
+    percent 2 doses]. Suppressed values are None.
+    """
+    # ices.py finds the Toronto rows and the columns we want by their headers, so this keeps
+    # working when ICES publishes a new edition with everything shifted around.
+    columns = read_ices_workbook(path)
+
+    ices = {}
+    for row, FSA_name in enumerate(columns['FSA']):
+        # Suppressed values come back as NaN. They are stored as None, and the FSA will keep its
+        # default value of -1. This can be easily detected and removed from data comparisons
+        # later.
+        ices[str(FSA_name)] = [
+            None if np.isnan(columns[column_name][row]) else float(columns[column_name][row])
+            for column_name in ('cases_per_100', 'hospitalizations_per_1000', 'deaths_per_1000',
+                                'percent_1_dose', 'percent_2_doses')
+        ]
+    return ices
+
+
+def read_population(path: str = POPULATION_PATH, FSAs: list[str] = None) -> dict[str, int]:
+    """
+    Returns a dict mapping FSAs to their population: just the ones in FSAs if given, or every FSA
+    in the census file if not. The census file is indexed once (see census.py), so later runs
+    look the FSAs up straight from the index instead of scanning the whole country again.
+    """
+    census = load_census(path)
+    if FSAs is None:
+        return census.to_dict('population')
+    return census.lookup(FSAs, 'population')
+
+
+def read_dinesafe(path: str = DINESAFE_PATH, boundaries_path: str = BOUNDARIES_PATH,
+                  profiler: Profiler = None, backend: Backend = None,
+                  mark_incomplete: bool = False) -> dict[str, list[int]]:
+    """
+    Returns a dict mapping every FSA any DineSafe establishment was found in to
+    [number of restaurants, minor infractions, significant infractions, crucial infractions].
+    If a profiler is given, the parsing and the geocoding are timed as separate stages.
+    backend is the geocoder handed to geocode_missing_FSAs. With mark_incomplete, the dict comes
+    back wrapped in a stage_cache.Incomplete if the geocoder gave up on any coordinates, so
+    run_stage doesn't store counts with those establishments missing.
+    """
+    # This next bit is very tricky. To add the infractions, we need to know what FSA each
+    # restaurant is in. But the dinesafe dataset provides the restaurant's street address,
+    # latitude and longitude, but NOT postal code. This is very annoying since the edges of postal
+    # codes are very jagged and there is no good way to describe the boundaries. How do we
+    # proceed? We get the Nominatim geolocator (see geocoding.py) to ping various map APIs
+    # with the coordinates to each restaurant! It will send us back a variety of information about
+    # those coordinates, including their postal code! We can then substring this for our FSA, and
+    # then map infractions to it and increase the number of restaurants contained within.
+    # ==============================================================================================
+    #                                           HOWEVER
+    # ==============================================================================================
+    # The Nominatim geolocator API (since I do not have the hardware capacity to download the
+    # whole thing) has a terms of use that specifies an absolute maximum of one request per
+    # second. A quick back-of-the-envelope calculation tells us that there are over 17000
+    # restaurants and food-serving establishments in the Dinesafe dataset, meaning that at 1
+    # second between requests, it will take almost 5 AND A HALF HOURS to do the entire thing.
+    # This is why I am using this Python file to prepare the data ahead of time into a nice,
+    # pre-made file for graphing.
+
+    # ==============================================================================================
+    #                                      THE FAST WAY
+    # ==============================================================================================
+    # If we have the FSA boundary polygons on disk (see fsa_resolver.py for where to get them), we
+    # don't need to ask Nominatim about most restaurants at all! We can just check which polygon
+    # each restaurant's coordinates fall inside of, for all 17000 restaurants at once, in a few
+    # seconds. Nominatim is only used as a fallback for the few restaurants that land outside
+    # every polygon (e.g. right on the lakeshore). If the boundary file is missing, everything
+    # falls back to Nominatim, so expect the full five hours in that case.
+
+    # The file is split into chunks that are parsed, placed in FSAs and added up on every core at
+    # once (see dinesafe_aggregate.py). What comes back is the counts for every FSA, plus the
+    # establishments the polygons couldn't place.
+    with _stage(profiler, 'dinesafe_parse') as stage:
+        names, partial_counts = aggregate(path, boundaries_path)
+        counts = partial_counts.to_dict(names)
+        if stage is not None:
+            stage.add_items(int(partial_counts.counts[:, 0].sum())
+                            + partial_counts.unresolved_coordinates.shape[0])
+
+    # The geocoder for whatever the local polygons couldn't place, added on top.
+    latitudes = list(partial_counts.unresolved_coordinates[:, 0])
+    longitudes = list(partial_counts.unresolved_coordinates[:, 1])
+    establishment_infractions = [tuple(int(count) for count in row)
+                                 for row in partial_counts.unresolved_infractions]
+    establishment_FSAs = [''] * len(latitudes)
+    with _stage(profiler, 'geocoding') as stage:
+        failures = geocode_missing_FSAs(latitudes, longitudes, establishment_FSAs, stage,
+                                        backend)
+
+    for FSA_name, extra in tally_establishments(establishment_FSAs,
+                                                establishment_infractions).items():
+        counts[FSA_name] = [total + count for total, count in
+                            zip(counts.get(FSA_name, [0, 0, 0, 0]), extra)]
+    if mark_incomplete and failures > 0:
+        return Incomplete(counts, f'{failures} coordinates got no answer from the geocoder')
+    return counts
+
+
+def locate_establishments(path: str = DINESAFE_PATH, boundaries_path: str = BOUNDARIES_PATH) \
+        -> tuple[list[float], list[float], list[tuple[int, int, int]], list[str]]:
+    """
+    Reads every establishment in the DineSafe file at path and finds its FSA using the local
+    boundary polygons only. Returns (latitudes, longitudes, (minor, significant, crucial)
+    infractions, FSAs) with one entry per establishment; the FSA is '' where no polygon matched.
+    Nothing here touches the network, so it is safe to run in parallel.
+    """
+    # First pass: stream through ds.xml and gather up every establishment's coordinates and
+    # infraction counts, so they can all be assigned to FSAs in one go afterwards. dinesafe.py
+    # reads the file a bit at a time, so we never have the whole thing sitting in memory.
+    latitudes = []
+    longitudes = []
+    establishment_infractions = []  # (minor, significant, crucial) for each establishment
+    for establishment in iter_establishments(path):
+        latitudes.append(establishment.latitude)
+        longitudes.append(establishment.longitude)
+        establishment_infractions.append((establishment.minor, establishment.significant,
+                                          establishment.crucial))
+
+    # Second pass: work out the FSA of every establishment from the local polygons.
+    if os.path.exists(boundaries_path):
+        resolver = FSAResolver.from_geojson(boundaries_path)
+        establishment_FSAs = [str(FSA_name) for FSA_name in resolver.resolve(latitudes, longitudes)]
+    else:
+        establishment_FSAs = [''] * len(latitudes)
+
+    return latitudes, longitudes, establishment_infractions, establishment_FSAs
+
+
+def tally_establishments(establishment_FSAs: list[str],
+                         establishment_infractions: list[tuple[int, int, int]]) \
+        -> dict[str, list[int]]:
+    """
+    Adds up the restaurants and infractions in each FSA. Returns a dict mapping each FSA to
+    [number of restaurants, minor infractions, significant infractions, crucial infractions].
+    """
+    counts = {}
+    for FSA_name, (minor_infractions, significant_infractions, crucial_infractions) in \
+            zip(establishment_FSAs, establishment_infractions):
+        if FSA_name == '':
+            continue  # Couldn't find a postcode at all. Only A VERY small fraction end up here.
+        if FSA_name not in counts:
+            counts[FSA_name] = [0, 0, 0, 0]
+        counts[FSA_name][0] += 1
+        counts[FSA_name][1] += minor_infractions
+        counts[FSA_name][2] += significant_infractions
+        counts[FSA_name][3] += crucial_infractions
+    return counts
+
+
+def _stage(profiler: Profiler, name: str):
+    """
+    Returns profiler.stage(name), or a do-nothing stand-in (that yields None) without a profiler.
+    """
+    return profiler.stage(name) if profiler is not None else nullcontext()
+
+
+def geocode_missing_FSAs(latitudes: list[float], longitudes: list[float],
+                         establishment_FSAs: list[str], stage: StageRecord = None,
+                         backend: Backend = None) -> int:
+    """
+    Fills in every empty entry of establishment_FSAs by asking a geocoder, in place. Returns how
+    many coordinates the geocoder gave up on; those are left empty, and left out of the on-disk
+    cache so they get asked about again.
+
+    Lots of restaurants share a building or a plaza, so we only ask about each (rounded)
+    coordinate once, and every answer goes into an on-disk cache as soon as it arrives. That way a
+    crash at hour four doesn't throw away four hours of pings!
+
+    backend is the geocoder to ask (see geocoding.py). By default it is set by the GEOCODER_*
+    environment variables, or the public Nominatim at one request per second if they aren't set.
+    A self-hosted Nominatim or Photon can take many requests at once, which turns hours into
+    minutes.
+
+    If a profiler stage is given, it counts the unique coordinates as its items, along with the
+    requests sent to the geocoder, retries, failures, cache hits and requests per second.
+    """
+    geocode_cache = GeocodeCache()
+    unresolved_coordinates = {}  # Maps a rounded cache key to the establishments sharing it
+    for i in range(len(establishment_FSAs)):
+        if establishment_FSAs[i] == '':
+            key = geocode_cache.key(latitudes[i], longitudes[i])
+            unresolved_coordinates.setdefault(key, []).append(i)
+
+    def fill_in(establishments_here: list[int], postcode: str) -> None:
+        if postcode is not None:
+            for i in establishments_here:
+                establishment_FSAs[i] = str.split(postcode)[0]
+
+    # Anything we've asked about before comes straight out of the cache.
+    to_ask = []  # The establishments sharing each coordinate the cache didn't have
+    for establishments_here in unresolved_coordinates.values():
+        found, postcode = geocode_cache.lookup(latitudes[establishments_here[0]],
+                                               longitudes[establishments_here[0]])
+        if found:
+            fill_in(establishments_here, postcode)
+        else:
+            to_ask.append(establishments_here)
+
+    def on_result(position: int, postcode: str) -> None:
+        # Called as each answer arrives, so it is saved even if the run dies halfway through.
+        establishments_here = to_ask[position]
+        geocode_cache.store(latitudes[establishments_here[0]],
+                            longitudes[establishments_here[0]], postcode)
+        fill_in(establishments_here, postcode)
+        if stage is not None:
+            stage.add_items()
+
+    # The rest get sent to the geocoder, as many at once as it allows. This is the part that
+    # used to take five hours, one request at a time.
+    client = None
+    if len(to_ask) > 0:
+        _, client = reverse_geocode([(latitudes[establishments_here[0]],
+                                      longitudes[establishments_here[0]])
+                                     for establishments_here in to_ask], backend, on_result)
+
+    if stage is not None:
+        stage.add_items(len(unresolved_coordinates) - len(to_ask))
+        stage.set('geocode_requests', client.requests if client is not None else 0)
+        stage.set('geocode_retries',
+                  client.attempts - client.requests if client is not None else 0)
+        stage.set('geocode_failures', client.failures if client is not None else 0)
+        stage.set('geocode_cache_hits', geocode_cache.hits)
+        stage.set('geocode_requests_per_second', (client.requests if client is not None else 0)
+                  / max(stage.elapsed(), 1e-9))
+
+    print(f'{len(unresolved_coordinates)} unique coordinates needed a geocoder lookup')
+    if client is not None and client.failures > 0:
+        print(f'{client.failures} of them got no answer, and will be asked about next run')
+    print(geocode_cache.report())
+    geocode_cache.close()
+    return client.failures if client is not None else 0
+
+
+def build_data(ices: dict[str, list], population: dict[str, int],
+               dinesafe: dict[str, list[int]]) -> dict[str, FSA]:
+    """
+    Merges the results of every stage into a dict mapping FSA names to FSA data types. Easiest way
+    to store and access info for all 96 Toronto FSAs. The FSAs in the ICES data decide which FSAs
+    are included.
+    """
+    data = {}
+    for FSA_name, (cases, hospitalizations, deaths, percent_1_dose, percent_2_doses) \
+            in ices.items():
+        data[FSA_name] = FSA(FSA_name)
+        # Suppressed values are left at the FSA's default of -1.0
+        if cases is not None:
+            data[FSA_name].total_covid_cases_per_100 = cases
+        if hospitalizations is not None:
+            data[FSA_name].total_covid_hospitalizations_per_1000 = hospitalizations
+        if deaths is not None:
+            data[FSA_name].total_covid_deaths_per_1000 = deaths
+        data[FSA_name].percent_1_dose = percent_1_dose
+        data[FSA_name].percent_2_doses = percent_2_doses
+
+        if FSA_name in population:
+            data[FSA_name].population = population[FSA_name]
+
+        if FSA_name in dinesafe:
+            restaurants, minor, significant, crucial = dinesafe[FSA_name]
+            data[FSA_name].number_of_restaurants = restaurants
+            data[FSA_name].number_of_minor_infractions = minor
+            data[FSA_name].number_of_significant_infractions = significant
+            data[FSA_name].number_of_crucial_infractions = crucial
+
+    return data
+
+
+def write_cleaned_data(data: dict[str, FSA], path: str = CLEANED_DATA_PATH) -> None:
+    """
+    Writes the data out to a .csv file, so we can access it later! A binary snapshot of it is
+    written too (see snapshot.py), so main.py can load it without parsing the csv.
+    """
+    table = FSATable.from_dict(data)
+    table.to_csv(path)
+    write_snapshot(table, path)
 
-# Alright! Data now contains:
-# Cases
-# Hospitalizations
-# Deaths
-# 1-dose vaccinations
-# 2-dose vaccinations
-# for all Toronto postal codes! Now, we need population, number of restaurants, and infractions.
 
-# Now, we move to population!
-# I have absolutely no idea why the file is called that. It just is.
-with open('T120120211212055123.csv', newline='') as population_csv:
-    popreader = csv.reader(population_csv, delimiter=',')
-    for row in popreader:
-        if len(row) == 0:  # This only happens at the end of the file, and stops it from complaining
-            break
-        if row[0] in data:
-            data[row[0]].population = int(row[4])
-
-# All right! Data now contains:
-# Cases
-# Hospitalizations
-# Deaths
-# 1-dose vaccinations
-# 2-dose vaccinations
-# Population
-# For all Toronto postal codes! All that's left is number of restaurants and infractions.
-
-# This next bit is very tricky. To add the infractions, we need to know what FSA each restaurant
-# is in. But the dinesafe dataset provides the restaurant's street address,
-# latitude and longitude, but NOT postal code. This is very annoying since the edges of postal
-# codes are very jagged and there is no good way to describe the boundaries. How do we proceed?
-# We use the geopy module to get the Nominatim geolocator to ping various map APIs with the
-# coordinates to each restaurant! It will send us back a variety of information about those
-# coordinates, including their postal code! We can then substring this for our FSA, and then
-# map infractions to it and increase the number of restaurants contained within.
 # ==================================================================================================
-#                                           HOWEVER
+#                              Actually running the code
 # ==================================================================================================
-# The Nominatim geolocator API (since I do not have the hardware capacity to download the whole
-# thing) has a terms of use that specifies an absolute maximum of one request per second. A quick
-# back-of-the-envelope calculation tells us that there are over 17000 restaurants and food-serving
-# establishments in the Dinesafe dataset, meaning that at 1 second between requests,
-# it will take almost 5 AND A HALF HOURS to do the entire thing. This is why I am
-# using this Python file to prepare the data ahead of time into a nice, pre-made file for graphing.
-# While this code is a large portion of my project, unless you have 5 hours to spare and a stable
-# internet connection, DO NOT RUN THIS FILE.
-
-
-# Opening the ds.xml data set as a string
-dinesafe_string: str
-with open('ds.xml', 'r') as file:
-    dinesafe_string = file.read().rstrip()
-
-# Strips weird french characters that were breaking the xml reader
-cleaned_dinesafe_string = unidecode.unidecode(dinesafe_string)
-
-# open Dinesafe data with minidom
-dinesafe_data = minidom.parseString(cleaned_dinesafe_string)
-# Create a list of all establishments in the Dinesafe data
-establishment_list = dinesafe_data.getElementsByTagName('ESTABLISHMENT')
-for establishment in establishment_list:
-    # Get latitude and longitude as floats.
-    latitude = float(establishment.getElementsByTagName('LATITUDE')[0].childNodes[0].data)
-    longitude = float(establishment.getElementsByTagName('LONGITUDE')[0].childNodes[0].data)
-    # Get list of infractions by this particular establishment.
-    infraction_list = establishment.getElementsByTagName('SEVERITY')
-
-    # Tracking infractions per restaurant
-    minor_infractions = 0
-    significant_infractions = 0
-    crucial_infractions = 0
-
-    # Seeing how many of each kind of infraction the restaurant has
-    for infraction in infraction_list:
-        if str(infraction.childNodes[0].data) == 'M - Minor':
-            minor_infractions += 1
-        elif str(infraction.childNodes[0].data) == 'S - Significant':
-            significant_infractions += 1
-        elif str(infraction.childNodes[0].data) == 'C - Crucial':
-            crucial_infractions += 1
-
-    # Formatting coordinates to feed them into pings to Nominatim
-    formatted_coordinates = str(str(latitude) + ', ' + str(longitude))
-
-    # Pinging Nominatim geolocator API. This is the part that makes the loop take 5 hours.
-    # Setting up user token to give Nominatim
-    geolocator = Nominatim(user_agent="restaurant-covid-analysis")
-    # Telling Nominatim I am searching for address/postal code by coordinates, not vice versa.
-    # Also, setting up RateLimiter to prevent >1 ping per second
-    reverse = RateLimiter(geolocator.reverse, min_delay_seconds=1, max_retries=5)
-    # Call to Nominatim API
-    location = reverse(formatted_coordinates)
-    # Checking to make sure location is recieved properly, and that it has a valid postal code in
-    # The Toronto area. If these conditions are not met, the result is discarded. In the end, only
-    # A VERY small fraction of cases get discarded.
-    if location is not None and 'address' in location.raw and 'postcode' in location.raw['address']:
-        FSA = str.split(location.raw['address']['postcode'])[0]
-        if FSA in data:
-            data[FSA].number_of_minor_infractions += minor_infractions
-            data[FSA].number_of_significant_infractions += significant_infractions
-            data[FSA].number_of_crucial_infractions += crucial_infractions
-            data[FSA].number_of_restaurants += 1
-
-
-# Fantastic! All the data is now properly recorded inside the data dict!
-
-# Let's write it out to a .csv file, so we can access it later!
-with open('cleaned_data.csv', 'w', newline='') as csvfile:
-    my_writer = csv.writer(csvfile)
-    my_writer.writerow(['FSA', 'Number of Restaurants', 'Number of Minor Infractions',
-                        'Number of Significant Infractions', 'Number of Crucial Infractions',
-                        'Total COVID-19 Cases per 100 people',
-                        'Total COVID-19 Hospitalizations per 1000 people',
-                        'Total COVID-19 Deaths per 1000 people',
-                        'Population', 'Percent With At Least 1 Dose', 'Percent With 2 Doses'])
-    for FSA in data:  # Write all the data for this FSA into the csv cleaned_data file
-        # Variable assignment for cleanliness
-        name = data[FSA].name
-        number_of_restaurants = data[FSA].number_of_restaurants
-        number_of_minor_infractions = data[FSA].number_of_minor_infractions
-        number_of_significant_infractions = data[FSA].number_of_significant_infractions
-        number_of_crucial_infractions = data[FSA].number_of_crucial_infractions
-        total_covid_cases_per_100 = data[FSA].total_covid_cases_per_100
-        total_covid_hospitalizations_per_1000 = data[FSA].total_covid_hospitalizations_per_1000
-        total_covid_deaths_per_1000 = data[FSA].total_covid_deaths_per_1000
-        population = data[FSA].population
-        percent_1_dose = data[FSA].percent_1_dose
-        percent_2_doses = data[FSA].percent_2_doses
-
-        # Actually write the row
-        my_writer.writerow([name, number_of_restaurants, number_of_minor_infractions,
-                            number_of_significant_infractions, number_of_crucial_infractions,
-                            total_covid_cases_per_100, total_covid_hospitalizations_per_1000,
-                            total_covid_deaths_per_1000, population, percent_1_dose,
-                            percent_2_doses])
+if __name__ == '__main__':
+    # Every stage is timed, and the report ends up in the profiles folder (see instrumentation.py).
+    # Set LIVE_PROGRESS=1 to watch each stage's progress as it runs.
+    profiler = Profiler('data_prep')
+
+    # Each stage only reruns if its input files changed since the last run.
+    with profiler.stage('ices') as stage:
+        ices = run_stage('ices', [ICES_PATH], read_ices)
+        stage.add_items(len(ices))
+    with profiler.stage('population') as stage:
+        # Only the FSAs in the ICES data are needed, so the stage depends on both files.
+        population = run_stage('population', [POPULATION_PATH, ICES_PATH],
+                               lambda: read_population(FSAs=list(ices)))
+        stage.add_items(len(population))
+    with profiler.stage('dinesafe') as stage:
+        dinesafe = run_stage('dinesafe', [DINESAFE_PATH, BOUNDARIES_PATH],
+                             lambda: read_dinesafe(profiler=profiler, mark_incomplete=True))
+        stage.add_items(len(dinesafe))
+
+    # Fantastic! All the data can now be put together into the data dict!
+    with profiler.stage('write') as stage:
+        data = build_data(ices, population, dinesafe)
+        write_cleaned_data(data)
+        stage.add_items(len(data))
+
+    print(profiler.summary())
+    print(f'Profile written to {profiler.write()}')
@@ -0,0 +1,126 @@
+"""
+A streaming reader for the DineSafe dataset (ds.xml). Rather than reading the whole file into a
+string and building a full DOM out of it (which used several times the file's size in memory),
+this reads the file a chunk at a time and hands back one small record per establishment, throwing
+away each establishment's XML as soon as it has been counted. Memory use stays flat no matter how
+big the yearly dumps get.
+"""
+import codecs  # Library for decoding the file a chunk at a time
+from typing import Iterator, NamedTuple
+import xml.etree.ElementTree as ElementTree  # Library for parsing .xml files incrementally
+import unidecode  # Library for getting rid of weird unicode characters
+
+# How many bytes of the file to read in at once.
+CHUNK_SIZE = 1 << 20
+
+# What each kind of infraction is called in the SEVERITY field.
+MINOR = 'M - Minor'
+SIGNIFICANT = 'S - Significant'
+CRUCIAL = 'C - Crucial'
+
+
+class Establishment(NamedTuple):
+    """
+    One DineSafe establishment: where it is, and how many infractions of each kind it has.
+    """
+    latitude: float
+    longitude: float
+    minor: int
+    significant: int
+    crucial: int
+
+
+def _clean_text(text: str) -> str:
+    """
+    Strips the weird french characters out of a text field. Only fields we actually compare
+    against go through this, and pure ASCII (nearly all of them) skips unidecode entirely.
+    """
+    text = text.strip()
+    if not text.isascii():
+        text = unidecode.unidecode(text)
+    return text
+
+
+def iter_establishments(path: str = 'ds.xml', encoding: str = 'utf-8') -> Iterator[Establishment]:
+    """
+    Yields an Establishment for every ESTABLISHMENT element in the DineSafe file at path.
+    Bytes that aren't valid in the given encoding are replaced instead of crashing the parser.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    parser = ElementTree.XMLPullParser(events=('start', 'end'))
+    open_elements = []  # The elements the parser is currently inside of, outermost first
+
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            parser.feed(decoder.decode(chunk))
+            yield from _read_events(parser, open_elements)
+        parser.feed(decoder.decode(b'', final=True))
+        parser.close()
+        yield from _read_events(parser, open_elements)
+
+
+def iter_establishments_between(path: str, start: int, end: int,
+                                encoding: str = 'utf-8') -> Iterator[Establishment]:
+    """
+    Same as iter_establishments, but only for bytes start to end of the file, which have to hold
+    a whole number of ESTABLISHMENT elements (see dinesafe_aggregate.split_file). The range is
+    read a CHUNK_SIZE at a time too, so memory stays flat however big it is.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    parser = ElementTree.XMLPullParser(events=('start', 'end'))
+    open_elements = []
+    # The range has no root element of its own, so it gets wrapped in one.
+    parser.feed('<CHUNK>')
+
+    with open(path, 'rb') as file:
+        file.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if len(chunk) == 0:
+                break
+            remaining -= len(chunk)
+            parser.feed(decoder.decode(chunk))
+            yield from _read_events(parser, open_elements)
+    parser.feed(decoder.decode(b'', final=True) + '</CHUNK>')
+    parser.close()
+    yield from _read_events(parser, open_elements)
+
+
+def _read_events(parser: ElementTree.XMLPullParser,
+                 open_elements: list) -> Iterator[Establishment]:
+    """
+    Turns whatever events the parser has ready into Establishments. open_elements keeps track of
+    which elements we are inside of between calls, so finished establishments can be removed from
+    their parent.
+    """
+    for event, element in parser.read_events():
+        if event == 'start':
+            open_elements.append(element)
+            continue
+
+        open_elements.pop()
+        if element.tag != 'ESTABLISHMENT':
+            continue
+
+        latitude = float(element.findtext('LATITUDE'))
+        longitude = float(element.findtext('LONGITUDE'))
+
+        # Seeing how many of each kind of infraction the restaurant has
+        minor = significant = crucial = 0
+        for severity in element.iter('SEVERITY'):
+            severity = _clean_text(severity.text or '')
+            if severity == MINOR:
+                minor += 1
+            elif severity == SIGNIFICANT:
+                significant += 1
+            elif severity == CRUCIAL:
+                crucial += 1
+
+        yield Establishment(latitude, longitude, minor, significant, crucial)
+
+        # Throw the establishment away now that we're done with it. Removing it from its parent
+        # too means the document root doesn't slowly fill up with empty husks.
+        element.clear()
+        if len(open_elements) > 0:
+            open_elements[-1].remove(element)
@@ -0,0 +1,207 @@
+"""
+Adds up restaurants and infractions per FSA for a DineSafe file using every core. The file is
+split into chunks on ESTABLISHMENT boundaries, and each worker process parses its chunk, finds
+the FSA of every establishment with the boundary polygons, and adds them up into its own partial
+count vectors. The partial counts are then merged back together in chunk order.
+
+Establishments the polygons couldn't place are collected (in file order) instead of being
+geocoded in the workers, so the parent can send them to Nominatim without breaking its rate limit.
+"""
+from concurrent.futures import ProcessPoolExecutor  # Library for counting chunks in parallel
+from itertools import chain  # Library for flattening establishments into one array
+import math  # Library for working out how many chunks are needed
+import os  # Library for working with files
+import re  # Library for finding where establishments start
+import numpy as np  # Library for the count vectors
+from dinesafe import iter_establishments_between
+from fsa_resolver import FSAResolver
+
+# Where an establishment starts: <ESTABLISHMENT> or <ESTABLISHMENT with attributes...>
+_START_TAG = re.compile(rb'<ESTABLISHMENT[\s>]')
+_END_TAG = b'</ESTABLISHMENT>'
+
+# How far to read when looking for the next establishment from a split point.
+_SCAN_SIZE = 1 << 16
+
+# The biggest a chunk gets, in bytes. Big files are split into more chunks rather than bigger
+# ones, so each worker's memory stays about the same however big the file is.
+MAX_CHUNK_BYTES = 16 << 20
+
+# What each column of the count vectors holds.
+COUNT_COLUMNS = ['number_of_restaurants', 'number_of_minor_infractions',
+                 'number_of_significant_infractions', 'number_of_crucial_infractions']
+
+
+class PartialCounts:
+    """
+    Restaurant and infraction counts for part of a DineSafe file: one row per FSA (in the order
+    of the boundary file) and one column per entry of COUNT_COLUMNS. Establishments that weren't
+    in any polygon are kept separately, with their coordinates and infraction counts, in order.
+    """
+    # Instance attributes:
+    # - counts: An (FSAs, 4) array of counts
+    # - unresolved_coordinates: An (n, 2) array of (latitude, longitude) for unplaced
+    #   establishments
+    # - unresolved_infractions: An (n, 3) array of (minor, significant, crucial) for them
+    counts: np.ndarray
+    unresolved_coordinates: np.ndarray
+    unresolved_infractions: np.ndarray
+
+    def __init__(self, n_fsas: int, counts: np.ndarray = None,
+                 unresolved_coordinates: np.ndarray = None,
+                 unresolved_infractions: np.ndarray = None) -> None:
+        if counts is None:
+            counts = np.zeros((n_fsas, len(COUNT_COLUMNS)), dtype=np.int64)
+        if unresolved_coordinates is None:
+            unresolved_coordinates = np.empty((0, 2), dtype=np.float64)
+        if unresolved_infractions is None:
+            unresolved_infractions = np.empty((0, 3), dtype=np.int64)
+        self.counts = counts
+        self.unresolved_coordinates = unresolved_coordinates
+        self.unresolved_infractions = unresolved_infractions
+
+    def merge(self, other: 'PartialCounts') -> 'PartialCounts':
+        """
+        Returns the combined counts of self and other. other's unplaced establishments go after
+        self's, so merging chunks in file order keeps them in file order.
+        """
+        return PartialCounts(
+            self.counts.shape[0], self.counts + other.counts,
+            np.vstack([self.unresolved_coordinates, other.unresolved_coordinates]),
+            np.vstack([self.unresolved_infractions, other.unresolved_infractions]))
+
+    def to_dict(self, names: list[str]) -> dict[str, list[int]]:
+        """
+        Returns the counts as a dict mapping each FSA (with at least one restaurant) to
+        [number of restaurants, minor, significant, crucial], like data_prep.py's stages use.
+        """
+        result = {}
+        for name, row in zip(names, self.counts):
+            if row[0] == 0:
+                continue
+            # An FSA split over several features in the boundary file gets added together.
+            if name not in result:
+                result[name] = [0] * len(COUNT_COLUMNS)
+            result[name] = [total + int(count) for total, count in zip(result[name], row)]
+        return result
+
+
+def split_file(path: str, n_chunks: int) -> list[tuple[int, int]]:
+    """
+    Returns up to n_chunks (start, end) byte ranges of the file that each hold a whole number of
+    ESTABLISHMENT elements, covering every establishment in the file exactly once.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as file:
+        first = _next_start(file, 0)
+        # The last chunk ends right after the last </ESTABLISHMENT>, leaving out the closing tag
+        # of the document itself.
+        last = _last_end(file, size)
+        if first is None or last is None or last <= first:
+            return []
+
+        boundaries = [first]
+        for i in range(1, n_chunks):
+            split = _next_start(file, first + (last - first) * i // n_chunks)
+            if split is not None and boundaries[-1] < split < last:
+                boundaries.append(split)
+        boundaries.append(last)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _next_start(file, position: int) -> int:
+    """
+    Returns the byte offset of the first <ESTABLISHMENT tag at or after position, or None.
+    """
+    while True:
+        file.seek(position)
+        window = file.read(_SCAN_SIZE + 16)  # The overlap catches tags split between windows
+        if len(window) == 0:
+            return None
+        match = _START_TAG.search(window)
+        if match is not None:
+            return position + match.start()
+        if len(window) <= 16:
+            return None
+        position += _SCAN_SIZE
+
+
+def _last_end(file, size: int) -> int:
+    """
+    Returns the byte offset just after the last </ESTABLISHMENT> tag in the file, or None.
+    """
+    position = size
+    while position > 0:
+        start = max(0, position - _SCAN_SIZE)
+        file.seek(start)
+        window = file.read(position - start + len(_END_TAG))
+        found = window.rfind(_END_TAG)
+        if found != -1:
+            return start + found + len(_END_TAG)
+        position = start
+    return None
+
+
+# Each worker process loads the boundaries once and keeps them here.
+_worker_resolver = None
+
+
+def _load_worker_resolver(boundaries_path: str) -> None:
+    global _worker_resolver
+    _worker_resolver = FSAResolver.from_geojson(boundaries_path) \
+        if boundaries_path is not None and os.path.exists(boundaries_path) else None
+
+
+def count_chunk(path: str, start: int, end: int, n_fsas: int) -> PartialCounts:
+    """
+    Parses the establishments between byte offsets start and end of the file, and returns their
+    partial counts. Runs inside a worker process.
+    """
+    # Establishments are streamed out of the file a piece at a time (see dinesafe.py) and only
+    # their five numbers are kept, so the chunk's XML is never all in memory at once.
+    records = np.fromiter(chain.from_iterable(iter_establishments_between(path, start, end)),
+                          dtype=np.float64).reshape(-1, 5)
+    coordinates = records[:, :2]
+    infractions = records[:, 2:].astype(np.int64)
+
+    if _worker_resolver is not None:
+        fsa_indices = _worker_resolver.resolve_indices(coordinates[:, 0], coordinates[:, 1])
+    else:
+        fsa_indices = np.full(records.shape[0], -1, dtype=np.int64)
+    placed = fsa_indices >= 0
+
+    # Add every placed establishment's row into its FSA's row, all at once.
+    partial = PartialCounts(n_fsas)
+    rows = np.hstack([np.ones((placed.sum(), 1), dtype=np.int64), infractions[placed]])
+    np.add.at(partial.counts, fsa_indices[placed], rows)
+    partial.unresolved_coordinates = coordinates[~placed]
+    partial.unresolved_infractions = infractions[~placed]
+    return partial
+
+
+def aggregate(path: str, boundaries_path: str = None, workers: int = None,
+              chunks_per_worker: int = 4) -> tuple[list[str], PartialCounts]:
+    """
+    Returns (the FSA names from the boundary file, the merged counts for the whole DineSafe file
+    at path). Without a boundary file, every establishment ends up unresolved.
+    """
+    _load_worker_resolver(boundaries_path)
+    names = list(_worker_resolver.names) if _worker_resolver is not None else []
+
+    workers = workers or os.cpu_count() or 1
+    ranges = split_file(path, max(workers * chunks_per_worker,
+                                  math.ceil(os.path.getsize(path) / MAX_CHUNK_BYTES)))
+    if workers == 1 or len(ranges) <= 1:
+        partials = [count_chunk(path, start, end, len(names)) for start, end in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_load_worker_resolver,
+                                 initargs=(boundaries_path,)) as pool:
+            # map hands results back in chunk order, whichever worker finishes first.
+            partials = list(pool.map(count_chunk, [path] * len(ranges),
+                                     [start for start, _ in ranges],
+                                     [end for _, end in ranges], [len(names)] * len(ranges)))
+
+    total = PartialCounts(len(names))
+    for partial in partials:
+        total = total.merge(partial)
+    return names, total
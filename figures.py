@@ -0,0 +1,113 @@
+"""
+Every graph main.py draws, described as data instead of as a copy-pasted block of code per graph.
+Each entry in FIGURES says which two columns of the FSA data to compare, and what to call the axes
+and the graph. To add a graph, just add an entry!
+
+The trendlines come from analysis.py, which fits every graph's line in one go, rather than
+having plotly run a separate statsmodels fit for each graph.
+"""
+import numpy as np  # Library for the trendline's end points
+import plotly.express as px  # Library for drawing the graphs
+import plotly.graph_objects as go  # Library for adding the trendline to each graph
+from FSA import FSATable
+
+# Each figure maps to a dict with the x and y columns (any column or derived column of an
+# FSATable), the axis labels, and the title.
+FIGURES = {
+    'restaurants_vs_cases': {
+        'x': 'number_of_restaurants',
+        'y': 'total_covid_cases_per_100',
+        'x_label': 'Number of Restaurants per FSA',
+        'y_label': 'COVID-19 Cases per 100 People',
+        'title': 'Number of Restaurants vs. COVID-19 Cases per 100 people for each FSA',
+    },
+    'infractions_vs_cases': {
+        'x': 'total_infractions',
+        'y': 'total_covid_cases_per_100',
+        'x_label': 'Total Number of Health Infractions per FSA',
+        'y_label': 'COVID-19 Cases per 100 People',
+        'title': 'Total Number of Health Infractions vs. '
+                 'COVID-19 Cases per 100 people for each FSA',
+    },
+    'restaurants_vs_hospitalizations': {
+        'x': 'number_of_restaurants',
+        'y': 'total_covid_hospitalizations_per_1000',
+        'x_label': 'Number of Restaurants per FSA',
+        'y_label': 'COVID-19 Hospitalizations per 1000 People',
+        'title': 'Number of Restaurants vs. '
+                 'COVID-19 Hospitalizations per 1000 people for each FSA',
+    },
+    'restaurants_vs_deaths': {
+        'x': 'number_of_restaurants',
+        'y': 'total_covid_deaths_per_1000',
+        'x_label': 'Number of Restaurants per FSA',
+        'y_label': 'COVID-19 Deaths per 1000 People',
+        'title': 'Number of Restaurants vs. COVID-19 Deaths per 1000 people for each FSA',
+    },
+    'crucial_infractions_vs_cases': {
+        'x': 'number_of_crucial_infractions',
+        'y': 'total_covid_cases_per_100',
+        'x_label': 'Number of Crucial Health Infractions per FSA',
+        'y_label': 'COVID-19 Cases per 100 People',
+        'title': 'Number of Crucial Health Infractions vs. '
+                 'COVID-19 Cases per 100 People for each FSA',
+    },
+    'crucial_infractions_vs_hospitalizations': {
+        'x': 'number_of_crucial_infractions',
+        'y': 'total_covid_hospitalizations_per_1000',
+        'x_label': 'Number of Crucial Health Infractions per FSA',
+        'y_label': 'COVID-19 Hospitalizations per 1000 People',
+        'title': 'Number of Crucial Health Infractions vs. '
+                 'COVID-19 Hospitalizations per 1000 People for each FSA',
+    },
+    'two_doses_vs_hospitalizations': {
+        'x': 'percent_2_doses',
+        'y': 'total_covid_hospitalizations_per_1000',
+        'x_label': 'Percentage of Population with 2 Doses of COVID-19 Vaccine',
+        'y_label': 'COVID-19 Hospitalizations per 1000 People',
+        'title': 'Percentage of Population with 2 Doses of COVID-19 Vaccine vs. '
+                 'COVID-19 Hospitalizations per 1000 People for each FSA',
+    },
+    'restaurant_density_vs_cases': {
+        'x': 'restaurant_density',
+        'y': 'total_covid_cases_per_100',
+        'x_label': 'Density of Restaurants by Population per FSA',
+        'y_label': 'COVID-19 Cases per 100 People',
+        'title': 'Density of Restaurants by Population vs. '
+                 'COVID-19 Cases per 100 People for each FSA',
+    },
+}
+
+
+def figure_pairs(figures: dict[str, dict] = None) -> list[tuple[str, str]]:
+    """
+    Returns the (x, y) column pair of every figure, in order, ready to hand to analysis.correlate.
+    """
+    figures = FIGURES if figures is None else figures
+    return [(spec['x'], spec['y']) for spec in figures.values()]
+
+
+def build_figure(table: FSATable, spec: dict, fit: dict) -> go.Figure:
+    """
+    Creates a plotly graph complete with axis labels, descriptive title, and an r-squared
+    trendline that can be hovered to see the r-squared value. fit is this figure's row of the
+    analysis.correlate results, holding the trendline's slope, intercept and r_squared.
+    """
+    known = table.unsuppressed(spec['x'], spec['y'])  # Only FSAs where both are unsuppressed
+    x = table[spec['x']][known]
+    y = table[spec['y']][known]
+
+    fig = px.scatter(x=x, y=y, labels={'x': spec['x_label'], 'y': spec['y_label']},
+                     opacity=0.60, title=spec['title'])
+
+    # The trendline only needs its two end points, since it is straight.
+    if len(x) > 0 and np.isfinite(fit['slope']):
+        line_x = np.array([x.min(), x.max()], dtype=np.float64)
+        line_y = fit['intercept'] + fit['slope'] * line_x
+        fig.add_trace(go.Scatter(
+            x=line_x, y=line_y, mode='lines', line={'color': 'darkblue'}, showlegend=False,
+            name='OLS trendline',
+            hovertemplate=(f'<b>OLS trendline</b><br>y = {fit["slope"]:.6g} * x + '
+                           f'{fit["intercept"]:.6g}<br>R<sup>2</sup>={fit["r_squared"]:.6f}<br>'
+                           '<br>x=%{x}<br>y=%{y} <b>(trend)</b><extra></extra>')))
+    return fig
@@ -0,0 +1,193 @@
+"""
+This file lets us figure out which FSA (Forward Sortation Area, the first 3 digits of your postal
+code) a latitude/longitude pair is in WITHOUT asking a web API. Instead of pinging Nominatim once
+per restaurant (which is what made data_prep.py take over five hours), we load the FSA boundary
+polygons once and test every coordinate against them locally.
+
+The boundary file is Statistics Canada's FSA boundary file, converted to GeoJSON in plain
+latitude/longitude (EPSG:4326). If you download the shapefile (lfsa000b16a_e.shp), it can be
+converted with:
+
+    ogr2ogr -f GeoJSON -t_srs EPSG:4326 fsa_boundaries.geojson lfsa000b16a_e.shp
+
+Each feature needs a property holding the FSA name. Statistics Canada calls it CFSAUID.
+"""
+import json  # Library for reading the GeoJSON boundary file
+import numpy as np  # Library for doing the point-in-polygon maths on whole arrays at once
+
+# Property names the FSA code might be stored under, in the order we check them.
+NAME_PROPERTIES = ('CFSAUID', 'FSA', 'name')
+
+# Roughly how many point/edge comparisons we do at once. Keeps memory use in check when a lot of
+# points land in the same big polygon.
+_CHUNK_SIZE = 4_000_000
+
+
+class FSAResolver:
+    """
+    Assigns coordinates to FSAs with point-in-polygon tests against a set of FSA boundaries.
+
+    Polygons are bucketed into a uniform grid of cells by their bounding boxes, so each point is
+    only ever tested against the handful of FSAs whose bounding box overlaps its cell. The tests
+    themselves are done with NumPy on every candidate point at once.
+    """
+    # Instance attributes:
+    # - names: The FSA name of each feature, in file order
+    # - edges: For each feature, an (n, 4) array of its ring edges as (x1, y1, x2, y2) rows.
+    #   Holes are included too, since the even-odd rule takes care of them for free.
+    # - bboxes: A (features, 4) array of (min_x, min_y, max_x, max_y) for each feature
+    # - grid_size: How many cells the grid has along each axis
+    names: list[str]
+    edges: list[np.ndarray]
+    bboxes: np.ndarray
+    grid_size: int
+
+    def __init__(self, features: list[tuple[str, list[np.ndarray]]], grid_size: int = 64) -> None:
+        """
+        features is a list of (FSA name, list of rings) pairs, where each ring is an (n, 2) array
+        of (longitude, latitude) vertices. Most people will want from_geojson instead.
+        """
+        self.names = []
+        self.edges = []
+        bboxes = []
+        for name, rings in features:
+            ring_edges = []
+            for ring in rings:
+                ring = np.asarray(ring, dtype=np.float64)
+                # Pair every vertex with the next one (wrapping around) to get the edges.
+                ring_edges.append(np.hstack([ring, np.roll(ring, -1, axis=0)]))
+            feature_edges = np.vstack(ring_edges)
+            self.names.append(name)
+            self.edges.append(feature_edges)
+            bboxes.append([feature_edges[:, 0].min(), feature_edges[:, 1].min(),
+                           feature_edges[:, 0].max(), feature_edges[:, 1].max()])
+        self.bboxes = np.array(bboxes, dtype=np.float64).reshape(-1, 4)
+        self.grid_size = grid_size
+
+        if len(self.names) > 0:
+            self._origin = self.bboxes[:, :2].min(axis=0)
+            extent = self.bboxes[:, 2:].max(axis=0) - self._origin
+            # Avoids dividing by zero for a degenerate (single point or line) boundary set.
+            self._cell_size = np.where(extent > 0, extent / grid_size, 1.0)
+
+    @classmethod
+    def from_geojson(cls, path: str, name_property: str = None,
+                     grid_size: int = 64) -> 'FSAResolver':
+        """
+        Loads FSA boundaries from a GeoJSON FeatureCollection of Polygons/MultiPolygons.
+        If name_property is not given, the first of NAME_PROPERTIES found on a feature is used.
+        """
+        with open(path, encoding='utf-8') as geojson_file:
+            collection = json.load(geojson_file)
+
+        features = []
+        for feature in collection['features']:
+            properties = feature.get('properties') or {}
+            if name_property is not None:
+                name = properties[name_property]
+            else:
+                name = next(properties[key] for key in NAME_PROPERTIES if key in properties)
+
+            geometry = feature['geometry']
+            if geometry['type'] == 'Polygon':
+                polygons = [geometry['coordinates']]
+            elif geometry['type'] == 'MultiPolygon':
+                polygons = geometry['coordinates']
+            else:
+                continue  # Points and lines can't contain anything, so skip them.
+
+            # All rings of all parts go into one list. Even-odd counting means holes and separate
+            # islands both come out right without having to treat them specially.
+            rings = [np.asarray(ring, dtype=np.float64)[:, :2]
+                     for polygon in polygons for ring in polygon]
+            features.append((str(name), rings))
+
+        return cls(features, grid_size=grid_size)
+
+    def _cells(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        Returns the flat grid cell index of each point. Points outside the grid get clipped to
+        the border cells, which is fine since they fail the bounding box test afterwards anyway.
+        """
+        col = np.clip(((x - self._origin[0]) / self._cell_size[0]).astype(np.int64),
+                      0, self.grid_size - 1)
+        row = np.clip(((y - self._origin[1]) / self._cell_size[1]).astype(np.int64),
+                      0, self.grid_size - 1)
+        return row * self.grid_size + col
+
+    def resolve_indices(self, latitudes, longitudes) -> np.ndarray:
+        """
+        Returns, for each coordinate, the index (into self.names) of the FSA containing it, or -1
+        if it falls outside every polygon.
+        """
+        y = np.asarray(latitudes, dtype=np.float64)
+        x = np.asarray(longitudes, dtype=np.float64)
+        result = np.full(x.shape, -1, dtype=np.int64)
+        if x.size == 0 or len(self.names) == 0:
+            return result
+
+        # Sort the points by grid cell, so every cell's points sit in one contiguous slice.
+        point_cells = self._cells(x, y)
+        order = np.argsort(point_cells, kind='stable')
+        sorted_cells = point_cells[order]
+
+        for feature, (min_x, min_y, max_x, max_y) in enumerate(self.bboxes):
+            # Work out which grid cells this feature's bounding box covers...
+            low_cell = self._cells(np.array([min_x]), np.array([min_y]))[0]
+            high_cell = self._cells(np.array([max_x]), np.array([max_y]))[0]
+            low_row, low_col = divmod(low_cell, self.grid_size)
+            high_row, high_col = divmod(high_cell, self.grid_size)
+
+            # ...then gather the points sitting in those cells, one row of cells at a time.
+            candidate_slices = []
+            for grid_row in range(low_row, high_row + 1):
+                start = np.searchsorted(sorted_cells, grid_row * self.grid_size + low_col, 'left')
+                stop = np.searchsorted(sorted_cells, grid_row * self.grid_size + high_col, 'right')
+                if stop > start:
+                    candidate_slices.append(order[start:stop])
+            if len(candidate_slices) == 0:
+                continue
+            candidates = np.concatenate(candidate_slices)
+
+            # Only test points that are still unassigned and inside the bounding box.
+            candidates = candidates[(result[candidates] == -1)
+                                    & (x[candidates] >= min_x) & (x[candidates] <= max_x)
+                                    & (y[candidates] >= min_y) & (y[candidates] <= max_y)]
+            if candidates.size == 0:
+                continue
+
+            inside = self._contains(self.edges[feature], x[candidates], y[candidates])
+            result[candidates[inside]] = feature
+
+        return result
+
+    def resolve(self, latitudes, longitudes) -> np.ndarray:
+        """
+        Returns an array of FSA names, one per coordinate. Coordinates that fall outside every
+        polygon get an empty string, so they can be sent to a fallback geocoder.
+        """
+        indices = self.resolve_indices(latitudes, longitudes)
+        names = np.array(self.names + [''])
+        return names[indices]  # An index of -1 picks the trailing '' we added.
+
+    @staticmethod
+    def _contains(edges: np.ndarray, px: np.ndarray, py: np.ndarray) -> np.ndarray:
+        """
+        Even-odd ray casting: shoot a ray from each point towards +x and count how many edges it
+        crosses. An odd count means the point is inside.
+        """
+        x1, y1, x2, y2 = edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+        # Horizontal edges never get crossed, and would divide by zero below.
+        keep = y1 != y2
+        x1, y1, x2, y2 = x1[keep], y1[keep], x2[keep], y2[keep]
+        slope = (x2 - x1) / (y2 - y1)
+
+        inside = np.zeros(px.shape, dtype=bool)
+        step = max(1, _CHUNK_SIZE // max(1, x1.size))
+        for start in range(0, px.size, step):
+            cx = px[start:start + step, None]
+            cy = py[start:start + step, None]
+            straddles = (y1 > cy) != (y2 > cy)
+            crosses = straddles & (cx < x1 + (cy - y1) * slope)
+            inside[start:start + step] = (np.count_nonzero(crosses, axis=1) % 2) == 1
+        return inside
@@ -0,0 +1,128 @@
+"""
+A persistent, on-disk cache for reverse geocoding results. Every postcode we get back from
+Nominatim is written to a small SQLite database the moment it arrives, so if data_prep.py crashes
+or the internet drops out partway through, the next run picks up right where the last one stopped
+instead of starting over from zero.
+
+Coordinates are rounded before being used as keys. At the default of 5 decimal places that is
+about a metre, which is plenty to make restaurants sharing a building or plaza share an entry.
+"""
+import argparse  # Library for reading command line options
+import sqlite3  # Library for the on-disk database the cache lives in
+
+DEFAULT_CACHE_PATH = 'geocode_cache.sqlite'
+
+
+class GeocodeCache:
+    """
+    Maps rounded (latitude, longitude) pairs to the postcode a geocoder returned for them.
+    A postcode of None is stored too, meaning "we asked, and there was no postcode", so those
+    coordinates don't get asked about again either.
+    """
+    # Instance attributes:
+    # - path: Where the SQLite database lives on disk
+    # - precision: Number of decimal places coordinates are rounded to before lookup
+    # - hits: Number of lookups answered from the cache during this run
+    # - misses: Number of lookups that weren't in the cache during this run
+    path: str
+    precision: int
+    hits: int
+    misses: int
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, precision: int = 5) -> None:
+        self.path = path
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+        self._connection = sqlite3.connect(path)
+        # WAL mode keeps every write cheap, which matters since we commit after each result.
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        # Coordinates are stored as scaled integers rather than floats, so keys always compare
+        # exactly. The precision is part of the key so changing it never mixes up old entries.
+        self._connection.execute('CREATE TABLE IF NOT EXISTS postcodes ('
+                                 'precision INTEGER, lat INTEGER, lon INTEGER, postcode TEXT, '
+                                 'PRIMARY KEY (precision, lat, lon))')
+        self._connection.commit()
+
+    def key(self, latitude: float, longitude: float) -> tuple[int, int]:
+        """
+        Returns the rounded key used to store these coordinates.
+        """
+        scale = 10 ** self.precision
+        return round(latitude * scale), round(longitude * scale)
+
+    def lookup(self, latitude: float, longitude: float) -> tuple[bool, str]:
+        """
+        Returns (found, postcode). found is False if these coordinates have never been resolved.
+        """
+        lat_key, lon_key = self.key(latitude, longitude)
+        row = self._connection.execute('SELECT postcode FROM postcodes '
+                                       'WHERE precision = ? AND lat = ? AND lon = ?',
+                                       (self.precision, lat_key, lon_key)).fetchone()
+        if row is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, row[0]
+
+    def store(self, latitude: float, longitude: float, postcode: str) -> None:
+        """
+        Records the postcode for these coordinates, and writes it to disk straight away.
+        """
+        lat_key, lon_key = self.key(latitude, longitude)
+        self._connection.execute('INSERT OR REPLACE INTO postcodes VALUES (?, ?, ?, ?)',
+                                 (self.precision, lat_key, lon_key, postcode))
+        self._connection.commit()
+
+    def forget_empty(self) -> int:
+        """
+        Removes every "no postcode" entry, so those coordinates get asked about again, and returns
+        how many there were. Only entries at this cache's precision are touched. Older versions of
+        data_prep.py stored one whenever a request failed (geopy's RateLimiter turned errors into
+        None, and later a refused request, e.g. a 403, came back as None too), so a cache filled
+        during an outage or a ban can hold lots of these that aren't real answers.
+        """
+        removed = self._connection.execute(
+            'DELETE FROM postcodes WHERE postcode IS NULL AND precision = ?',
+            (self.precision,)).rowcount
+        self._connection.commit()
+        return removed
+
+    def size(self) -> tuple[int, int]:
+        """
+        Returns (coordinates stored, how many of them have no postcode).
+        """
+        return self._connection.execute('SELECT COUNT(*), COUNT(*) - COUNT(postcode) '
+                                        'FROM postcodes WHERE precision = ?',
+                                        (self.precision,)).fetchone()
+
+    def report(self) -> str:
+        """
+        Returns a one-line summary of how well the cache did this run.
+        """
+        total = self.hits + self.misses
+        rate = 100 * self.hits / total if total > 0 else 0.0
+        return f'Geocode cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)'
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> 'GeocodeCache':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Look after the geocode cache.')
+    parser.add_argument('--path', default=DEFAULT_CACHE_PATH, help='the cache database')
+    parser.add_argument('--forget-empty', action='store_true',
+                        help='remove every "no postcode" entry, so they are asked about again')
+    args = parser.parse_args()
+
+    with GeocodeCache(args.path) as cache:
+        if args.forget_empty:
+            print(f'Removed {cache.forget_empty()} "no postcode" entries')
+        count, empty = cache.size()
+        print(f'{count} coordinates cached, {empty} of them with no postcode')
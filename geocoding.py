@@ -0,0 +1,287 @@
+"""
+Reverse geocoding (coordinates to postcode) on asyncio, for the establishments the FSA boundary
+polygons couldn't place. Compared to calling geopy one request at a time, this:
+
+- keeps one HTTP session open, so connections are reused instead of reconnecting per request,
+- runs several requests at once, up to a configurable concurrency,
+- paces requests with a token bucket per backend, so the public Nominatim still only gets one
+  request per second while a self-hosted Nominatim or Photon can be given hundreds,
+- retries failed requests (timeouts, 429s, 5xx errors) with exponential backoff, honouring
+  Retry-After when the server sends one.
+
+Backends are small classes that know how to build the request URL and pull the postcode out of
+the answer; NominatimBackend and PhotonBackend are included. By default the public Nominatim is
+used at 1 request per second. To point data_prep.py at a self-hosted instance, set:
+
+    GEOCODER_BACKEND=nominatim (or photon)
+    GEOCODER_URL=http://localhost:8080
+    GEOCODER_RATE=200            # requests per second
+    GEOCODER_CONCURRENCY=32      # requests in flight at once
+
+mock_geocoder.py has a local stand-in server to try it against without touching the network.
+"""
+from abc import ABC, abstractmethod  # Library for making sure backends fill in every method
+import asyncio  # Library for running many requests at once
+import os  # Library for reading the settings from the environment
+import random  # Library for spreading out retries
+from typing import Callable, Iterable
+import aiohttp  # Library for making HTTP requests over a shared, reused connection pool
+
+USER_AGENT = 'restaurant-covid-analysis'
+
+# Status codes worth trying again after a pause. Anything else is a real answer.
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class GeocodingError(Exception):
+    """
+    Raised when a request still fails after every retry.
+    """
+
+
+class TokenBucket:
+    """
+    Hands out permission to send a request at no more than rate per second on average, allowing
+    bursts of up to capacity requests after a quiet spell.
+    """
+    # Instance attributes:
+    # - rate: How many tokens are added back per second
+    # - capacity: The most tokens the bucket holds at once
+    rate: float
+    capacity: float
+
+    def __init__(self, rate: float, capacity: float = 1) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """
+        Waits until a token is available, then takes it.
+        """
+        # The lock makes waiters queue up in order, instead of all waking up at once.
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self._updated is not None:
+                    self._tokens = min(self.capacity,
+                                       self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class Backend(ABC):
+    """
+    A reverse geocoding service: where it is, how hard it may be pushed, and how to talk to it.
+    Subclasses fill in params and parse; one that doesn't can't be created.
+    """
+    # Instance attributes:
+    # - url: The service's reverse geocoding endpoint
+    # - rate: The most requests per second it may be sent
+    # - concurrency: The most requests that may be waiting on it at once
+    # - timeout: How many seconds to wait for one answer
+    url: str
+    rate: float
+    concurrency: int
+    timeout: float
+
+    def __init__(self, url: str, rate: float = 1, concurrency: int = 1,
+                 timeout: float = 10) -> None:
+        self.url = url
+        self.rate = rate
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    @abstractmethod
+    def params(self, latitude: float, longitude: float) -> dict:
+        """
+        Returns the query parameters asking about a coordinate.
+        """
+
+    @abstractmethod
+    def parse(self, answer: dict) -> str:
+        """
+        Returns the postcode in a decoded JSON answer, or None if it doesn't have one.
+        """
+
+
+class NominatimBackend(Backend):
+    """
+    Nominatim (https://nominatim.org). The public instance allows one request per second, which
+    is the default; a self-hosted one can be given much more.
+    """
+
+    def __init__(self, url: str = 'https://nominatim.openstreetmap.org', rate: float = 1,
+                 concurrency: int = 1, timeout: float = 10) -> None:
+        super().__init__(url.rstrip('/') + '/reverse', rate, concurrency, timeout)
+
+    def params(self, latitude: float, longitude: float) -> dict:
+        return {'lat': f'{latitude}', 'lon': f'{longitude}', 'format': 'jsonv2',
+                'addressdetails': '1'}
+
+    def parse(self, answer: dict) -> str:
+        return answer.get('address', {}).get('postcode')
+
+
+class PhotonBackend(Backend):
+    """
+    Photon (https://photon.komoot.io), usually self-hosted when used for this.
+    """
+
+    def __init__(self, url: str = 'http://localhost:2322', rate: float = 50,
+                 concurrency: int = 8, timeout: float = 10) -> None:
+        super().__init__(url.rstrip('/') + '/reverse', rate, concurrency, timeout)
+
+    def params(self, latitude: float, longitude: float) -> dict:
+        return {'lat': f'{latitude}', 'lon': f'{longitude}', 'limit': '1'}
+
+    def parse(self, answer: dict) -> str:
+        features = answer.get('features') or [{}]
+        return features[0].get('properties', {}).get('postcode')
+
+
+BACKENDS = {'nominatim': NominatimBackend, 'photon': PhotonBackend}
+
+
+def backend_from_environment() -> Backend:
+    """
+    Returns the backend described by the GEOCODER_* environment variables (see the top of this
+    file), or the public Nominatim at 1 request per second if none are set.
+    """
+    backend_class = BACKENDS[os.environ.get('GEOCODER_BACKEND', 'nominatim').lower()]
+    settings = {}
+    if 'GEOCODER_URL' in os.environ:
+        settings['url'] = os.environ['GEOCODER_URL']
+    if 'GEOCODER_RATE' in os.environ:
+        settings['rate'] = float(os.environ['GEOCODER_RATE'])
+    if 'GEOCODER_CONCURRENCY' in os.environ:
+        settings['concurrency'] = int(os.environ['GEOCODER_CONCURRENCY'])
+    return backend_class(**settings)
+
+
+class GeocodingClient:
+    """
+    Sends reverse geocoding requests to one backend over a shared session, paced by a token
+    bucket, with at most backend.concurrency requests in flight. Use it as an async context
+    manager, so the session gets closed:
+
+        async with GeocodingClient(backend) as client:
+            postcode = await client.reverse(43.65, -79.38)
+    """
+    # Instance attributes:
+    # - backend: The service being asked
+    # - max_retries: How many times a failed request is tried again before giving up
+    # - backoff: The pause before the first retry, in seconds; it doubles every retry after
+    # - requests: Coordinates asked about so far
+    # - attempts: HTTP requests sent so far, retries included
+    # - failures: Coordinates given up on, after every retry failed or a refusal (GeocodingError)
+    backend: Backend
+    max_retries: int
+    backoff: float
+    requests: int
+    attempts: int
+    failures: int
+
+    def __init__(self, backend: Backend, max_retries: int = 5, backoff: float = 1) -> None:
+        self.backend = backend
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.requests = 0
+        self.attempts = 0
+        self.failures = 0
+        self._session = None
+        self._bucket = None
+        self._slots = None
+
+    async def __aenter__(self) -> 'GeocodingClient':
+        # These belong to the running event loop, so they're made here rather than in __init__.
+        self._bucket = TokenBucket(self.backend.rate, capacity=max(1, self.backend.concurrency))
+        self._slots = asyncio.Semaphore(self.backend.concurrency)
+        self._session = aiohttp.ClientSession(
+            headers={'User-Agent': USER_AGENT},
+            connector=aiohttp.TCPConnector(limit=self.backend.concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.backend.timeout))
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._session.close()
+
+    async def reverse(self, latitude: float, longitude: float) -> str:
+        """
+        Returns the postcode at a coordinate, or None if the service answered but has no postcode
+        there. Raises GeocodingError if the request kept failing after every retry, or the
+        service refused it (any other status that isn't worth retrying).
+        """
+        self.requests += 1
+        async with self._slots:
+            for attempt in range(self.max_retries + 1):
+                await self._bucket.acquire()
+                self.attempts += 1
+                delay = self.backoff * 2 ** attempt * (1 + random.random() / 2)
+                try:
+                    async with self._session.get(
+                            self.backend.url,
+                            params=self.backend.params(latitude, longitude)) as response:
+                        if response.status in RETRY_STATUSES:
+                            retry_after = response.headers.get('Retry-After', '')
+                            if retry_after.isdigit():
+                                delay = max(delay, float(retry_after))
+                        elif response.status != 200:
+                            # e.g. 403 when the User-Agent or IP is blocked. That says nothing
+                            # about the coordinate, so it mustn't be taken as "no postcode".
+                            self.failures += 1
+                            raise GeocodingError(f'{self.backend.url} answered {response.status} '
+                                                 f'for {latitude}, {longitude}')
+                        else:
+                            # Somewhere without a postcode (e.g. the middle of the lake) is still
+                            # a 200, just without one in it ({"error": ...} from Nominatim).
+                            return self.backend.parse(await response.json(content_type=None))
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                    pass
+                if attempt < self.max_retries:
+                    await asyncio.sleep(delay)
+        self.failures += 1
+        raise GeocodingError(f'No answer for {latitude}, {longitude} after '
+                             f'{self.max_retries + 1} tries')
+
+
+async def reverse_many(coordinates: list[tuple[float, float]], backend: Backend,
+                       on_result: Callable[[int, str], None] = None,
+                       **client_options) -> tuple[list[str], GeocodingClient]:
+    """
+    Looks up every (latitude, longitude) in coordinates, as many at once as the backend allows.
+    on_result(position, postcode) is called as each answer arrives, so answers can be saved
+    straight away. Coordinates that kept failing are skipped (and left as None) rather than
+    stopping the rest. Returns (the postcodes in the same order as coordinates, the client, for
+    its counts).
+    """
+    postcodes = [None] * len(coordinates)
+    async with GeocodingClient(backend, **client_options) as client:
+        async def look_up(position: int, latitude: float, longitude: float) -> None:
+            try:
+                postcodes[position] = await client.reverse(latitude, longitude)
+            except GeocodingError:
+                return  # Counted in client.failures; asked about again on the next run
+            if on_result is not None:
+                on_result(position, postcodes[position])
+
+        await asyncio.gather(*(look_up(position, latitude, longitude)
+                               for position, (latitude, longitude) in enumerate(coordinates)))
+    return postcodes, client
+
+
+def reverse_geocode(coordinates: Iterable[tuple[float, float]], backend: Backend = None,
+                    on_result: Callable[[int, str], None] = None,
+                    **client_options) -> tuple[list[str], GeocodingClient]:
+    """
+    reverse_many for code that isn't async itself. backend defaults to backend_from_environment().
+    """
+    if backend is None:
+        backend = backend_from_environment()
+    return asyncio.run(reverse_many(list(coordinates), backend, on_result, **client_options))
@@ -0,0 +1,143 @@
+"""
+Reads the ICES COVID-19 vaccination workbook (ICES-COVID19-Vaccination-Data-by-FSA.xlsx) quickly,
+and without caring exactly which rows the data is on.
+
+The old way opened the whole workbook (every sheet, every style) and read hard-coded row numbers
+one cell at a time, which quietly breaks whenever ICES publishes a new edition with the rows
+shifted around. Instead, this streams each sheet in read-only mode, finds the header row by
+looking for the "FSA" column, finds the columns we want by their header text, and keeps only the
+rows for the FSAs we care about (the Toronto "M" FSAs by default).
+"""
+import re  # Library for matching FSA names
+import numpy as np  # Library for storing each column as an array
+import openpyxl  # Library for reading data from excel spreadsheet
+
+# The columns we pull out of the workbook. Each one maps to (a bit of the sheet's name, a bit of
+# the column's header). Both are matched ignoring case and line breaks.
+ICES_COLUMNS = {
+    'cases_per_100': ('at least 1 dose', 'covid-19 cases'),
+    'hospitalizations_per_1000': ('at least 1 dose', 'covid-19 hospitalizations'),
+    'deaths_per_1000': ('at least 1 dose', 'covid-19 deaths'),
+    'percent_1_dose': ('at least 1 dose', '(all ages'),
+    'percent_2_doses': ('2 doses', '(all ages'),
+}
+
+# What an FSA name looks like: letter, digit, letter.
+_FSA_PATTERN = re.compile(r'^[A-Z]\d[A-Z]$')
+
+
+def _normalize(text) -> str:
+    """
+    Lowercases text and squashes all runs of whitespace (including line breaks) into one space.
+    """
+    return ' '.join(str(text).split()).lower()
+
+
+def _to_float(value) -> float:
+    """
+    Returns value as a float. Suppressed ('*') and other non-numeric cells come back as NaN.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
+
+
+def read_ices_workbook(path: str, columns: dict[str, tuple[str, str]] = None,
+                       prefix: str = 'M') -> dict[str, np.ndarray]:
+    """
+    Returns a dict of columns pulled out of the ICES workbook at path: 'FSA' holds the FSA names,
+    and every key of columns holds a float array lined up with them, with NaN for suppressed
+    values. Only FSAs starting with prefix are kept ('' keeps all of Ontario).
+
+    The FSAs (and their order) come from the first sheet asked for. Every sheet is read exactly
+    once, no matter how many columns are taken from it.
+    """
+    if columns is None:
+        columns = ICES_COLUMNS
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        # Group the requested columns by sheet, so each sheet only gets streamed through once.
+        sheet_columns = {}
+        for column_name, (sheet_pattern, header_pattern) in columns.items():
+            sheet_name = _find_sheet(workbook.sheetnames, sheet_pattern)
+            sheet_columns.setdefault(sheet_name, {})[column_name] = _normalize(header_pattern)
+
+        names = None
+        result = {}
+        for sheet_name, wanted in sheet_columns.items():
+            sheet_names, sheet_values = _read_sheet(workbook[sheet_name], wanted, prefix)
+            if names is None:
+                names = sheet_names
+                result.update(sheet_values)
+                continue
+
+            # Line later sheets up with the first one by FSA name.
+            row_of = {name: row for row, name in enumerate(sheet_names)}
+            positions = np.array([row_of.get(name, -1) for name in names], dtype=np.int64)
+            for column_name, values in sheet_values.items():
+                aligned = np.full(len(names), np.nan)
+                found = positions >= 0
+                aligned[found] = values[positions[found]]
+                result[column_name] = aligned
+    finally:
+        workbook.close()  # Read-only workbooks keep the file open until closed.
+
+    result['FSA'] = np.array(names if names is not None else [], dtype=str)
+    return result
+
+
+def _find_sheet(sheet_names: list[str], pattern: str) -> str:
+    """
+    Returns the name of the first sheet whose (normalized) name contains pattern.
+    """
+    pattern = _normalize(pattern)
+    for sheet_name in sheet_names:
+        if pattern in _normalize(sheet_name):
+            return sheet_name
+    raise KeyError(f'No sheet matching {pattern!r} in the ICES workbook')
+
+
+def _read_sheet(sheet, wanted: dict[str, str],
+                prefix: str) -> tuple[list[str], dict[str, np.ndarray]]:
+    """
+    Streams through one sheet. Returns the FSA names found and, for each wanted column, its values.
+    """
+    column_index = None  # Maps each wanted column to its position, once the header is found
+    names = []
+    values = {column_name: [] for column_name in wanted}
+
+    for row in sheet.iter_rows(values_only=True):
+        if len(row) == 0:
+            continue
+
+        if column_index is None:
+            # Still looking for the header row, the one that starts with "FSA".
+            if row[0] is None or _normalize(row[0]) != 'fsa':
+                continue
+            headers = [_normalize(header) if header is not None else '' for header in row]
+            column_index = {}
+            for column_name, header_pattern in wanted.items():
+                matches = [i for i, header in enumerate(headers) if header_pattern in header]
+                if len(matches) == 0:
+                    raise KeyError(f'No column matching {header_pattern!r} in sheet '
+                                   f'{sheet.title!r}')
+                column_index[column_name] = matches[0]
+            continue
+
+        name = row[0]
+        if not isinstance(name, str):
+            continue
+        name = name.strip()
+        if _FSA_PATTERN.match(name) is None or not name.startswith(prefix):
+            continue
+
+        names.append(name)
+        for column_name, i in column_index.items():
+            values[column_name].append(_to_float(row[i]) if i < len(row) else np.nan)
+
+    if column_index is None:
+        raise KeyError(f'No header row starting with "FSA" in sheet {sheet.title!r}')
+
+    return names, {column_name: np.array(column, dtype=np.float64)
+                   for column_name, column in values.items()}
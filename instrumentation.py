@@ -0,0 +1,323 @@
+"""
+Keeps track of how long each part of a run takes, so we know where the time actually goes
+instead of watching the console. For every stage this records:
+
+- wall time (how long it took on the clock) and CPU time (for this process and, separately, for
+  any worker processes that finished during the stage),
+- the peak memory (RSS) of this process during the stage, and the peak combined RSS of its
+  worker processes (process pools) during the stage,
+- how many items (rows, establishments, graphs...) it handled, and the rate,
+- any other counters the stage wants to keep, like geocoding requests, retries and cache hits.
+
+At the end of a run the report is written as JSON to the profiles folder, one file per run, so
+nightly runs can be compared for regressions. Set LIVE_PROGRESS=1 (or pass live=True) to get a
+progress line on the terminal that updates while each stage runs.
+"""
+from contextlib import contextmanager  # Library for making stages work with "with"
+from datetime import datetime, timezone  # Library for timestamping reports
+import glob  # Library for finding worker processes in /proc
+import json  # Library for writing the report
+import os  # Library for working with files and directories
+import sys  # Library for writing the live progress line
+import threading  # Library for updating the live progress line in the background
+import time  # Library for measuring wall and CPU time
+
+try:
+    import resource  # Library for measuring memory and worker CPU time. Not on Windows.
+except ImportError:
+    resource = None
+
+DEFAULT_PROFILE_DIR = 'profiles'
+
+# How often memory is sampled while a stage runs, in seconds.
+SAMPLE_INTERVAL = 0.05
+
+_PAGE_MB = os.sysconf('SC_PAGE_SIZE') / (1024 * 1024) if hasattr(os, 'sysconf') else None
+
+
+def _peak_rss_mb(who: int = None) -> float:
+    """
+    Returns the peak memory use so far, in megabytes, of this process (or, with
+    who=resource.RUSAGE_CHILDREN, of the biggest finished worker process), or None if unknown.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _rss_mb(pid: str = 'self') -> float:
+    """
+    Returns the memory a process is using right now, in megabytes, from /proc. None where there
+    is no /proc (anywhere but Linux) or the process has already gone.
+    """
+    try:
+        with open(f'/proc/{pid}/statm', encoding='ascii') as statm:
+            return int(statm.read().split()[1]) * _PAGE_MB
+    except (OSError, ValueError, IndexError, TypeError):
+        return None
+
+
+def _child_pids() -> list[str]:
+    """
+    Returns the process IDs of this process's live children, from /proc.
+    """
+    children_paths = glob.glob('/proc/self/task/*/children')
+    if len(children_paths) > 0:
+        pids = []
+        for children_path in children_paths:
+            try:
+                with open(children_path, encoding='ascii') as children_file:
+                    pids.extend(children_file.read().split())
+            except OSError:
+                continue
+        return pids
+
+    # Kernels built without the children files: find every process whose parent is this one.
+    # The parent ID comes right after the (parenthesised, possibly spaced) command name.
+    parent = str(os.getpid())
+    pids = []
+    for stat_path in glob.glob('/proc/[0-9]*/stat'):
+        try:
+            with open(stat_path, encoding='ascii', errors='replace') as stat_file:
+                fields = stat_file.read().rpartition(')')[2].split()
+        except OSError:
+            continue
+        if len(fields) > 1 and fields[1] == parent:
+            pids.append(stat_path.split('/')[2])
+    return pids
+
+
+def _children_rss_mb() -> float:
+    """
+    Returns the combined memory of this process's live child processes (e.g. a process pool's
+    workers) right now, in megabytes, or None where /proc isn't available.
+    """
+    if _rss_mb() is None:
+        return None
+    return sum(_rss_mb(pid) or 0.0 for pid in _child_pids())
+
+
+def _max(current: float, new: float) -> float:
+    """
+    The bigger of two measurements, either of which may be None (unknown).
+    """
+    if current is None:
+        return new
+    if new is None:
+        return current
+    return max(current, new)
+
+
+def _children_cpu_seconds() -> float:
+    """
+    Returns the CPU time used by finished worker processes so far, or 0 if unknown.
+    """
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class StageRecord:
+    """
+    The measurements for one stage of a run. Code running inside the stage can call add_items and
+    count to record what it did.
+    """
+    # Instance attributes:
+    # - name: The name of the stage
+    # - items: How many items the stage handled
+    # - counters: Any other counts the stage kept, by name
+    # - wall_seconds, cpu_seconds, children_cpu_seconds: Filled in when it ends
+    # - peak_rss_mb: The most memory this process used during the stage
+    # - children_peak_rss_mb: The most memory its worker processes used at once during the stage
+    name: str
+    items: int
+    counters: dict[str, float]
+    wall_seconds: float
+    cpu_seconds: float
+    children_cpu_seconds: float
+    peak_rss_mb: float
+    children_peak_rss_mb: float
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.items = 0
+        self.counters = {}
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.children_cpu_seconds = None
+        self.peak_rss_mb = None
+        self.children_peak_rss_mb = None
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._start_children_cpu = _children_cpu_seconds()
+        self._start_peak = _peak_rss_mb()
+        self._start_children_peak = _peak_rss_mb(resource.RUSAGE_CHILDREN) \
+            if resource is not None else None
+        self.sample()
+
+    def add_items(self, count: int = 1) -> None:
+        self.items += count
+
+    def count(self, counter: str, amount: float = 1) -> None:
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def set(self, counter: str, value: float) -> None:
+        self.counters[counter] = value
+
+    def elapsed(self) -> float:
+        """
+        Returns the wall time so far (or in total, once the stage has ended).
+        """
+        if self.wall_seconds is not None:
+            return self.wall_seconds
+        return time.perf_counter() - self._start_wall
+
+    def sample(self) -> None:
+        """
+        Checks how much memory this process and its workers are using right now, and keeps the
+        highest seen. Called every SAMPLE_INTERVAL while the stage runs.
+        """
+        self.peak_rss_mb = _max(self.peak_rss_mb, _rss_mb())
+        self.children_peak_rss_mb = _max(self.children_peak_rss_mb, _children_rss_mb())
+
+    def finish(self) -> None:
+        self.wall_seconds = time.perf_counter() - self._start_wall
+        self.cpu_seconds = time.process_time() - self._start_cpu
+        self.children_cpu_seconds = _children_cpu_seconds() - self._start_children_cpu
+        self.sample()
+        # Sampling can miss a short spike, but the kernel's high-water marks can't. If one went
+        # up during the stage, the new high was reached during the stage.
+        peak = _peak_rss_mb()
+        if peak is not None and peak > self._start_peak:
+            self.peak_rss_mb = _max(self.peak_rss_mb, peak)
+        children_peak = _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource is not None else None
+        if children_peak is not None and children_peak > self._start_children_peak:
+            self.children_peak_rss_mb = _max(self.children_peak_rss_mb, children_peak)
+
+    def to_dict(self) -> dict:
+        wall = self.elapsed()
+        result = {'name': self.name, 'wall_seconds': wall, 'cpu_seconds': self.cpu_seconds,
+                  'children_cpu_seconds': self.children_cpu_seconds,
+                  'peak_rss_mb': self.peak_rss_mb,
+                  'children_peak_rss_mb': self.children_peak_rss_mb, 'items': self.items,
+                  'items_per_second': self.items / wall if wall > 0 else None}
+        result.update(self.counters)
+        return result
+
+
+class Profiler:
+    """
+    Collects a StageRecord for every stage of a run:
+
+        profiler = Profiler('data_prep')
+        with profiler.stage('census') as stage:
+            ...
+            stage.add_items(len(rows))
+        profiler.write()
+    """
+    # Instance attributes:
+    # - run_name: What the run is called, used in the report's file name
+    # - stages: The records of every stage so far, in the order they started
+    # - live: Whether to show a live progress line while stages run
+    run_name: str
+    stages: list[StageRecord]
+    live: bool
+
+    def __init__(self, run_name: str, live: bool = None, stream=None) -> None:
+        self.run_name = run_name
+        self.stages = []
+        self.live = live if live is not None else os.environ.get('LIVE_PROGRESS') == '1'
+        self._stream = stream if stream is not None else sys.stderr
+        self._active = []  # The stages running right now, innermost last
+        self._started = datetime.now(timezone.utc)
+        self._start_wall = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Measures everything inside the with block as one stage, and yields its StageRecord.
+        """
+        record = StageRecord(name)
+        self.stages.append(record)
+        self._active.append(record)
+        stop = threading.Event()
+        sampler = threading.Thread(target=self._sample_memory, args=(record, stop), daemon=True)
+        sampler.start()
+        ticker = None
+        if self.live:
+            ticker = threading.Thread(target=self._show_progress, args=(record, stop), daemon=True)
+            ticker.start()
+        try:
+            yield record
+        finally:
+            stop.set()
+            sampler.join()
+            record.finish()
+            self._active.remove(record)
+            if ticker is not None:
+                ticker.join()
+                self._stream.write(f'\r{self._progress_line(record)}\n')
+                self._stream.flush()
+
+    def _progress_line(self, record: StageRecord) -> str:
+        elapsed = record.elapsed()
+        line = f'[{self.run_name}] {record.name}: {elapsed:.1f}s'
+        if record.items > 0:
+            line += f', {record.items} items ({record.items / max(elapsed, 1e-9):.0f}/s)'
+        for counter, value in record.counters.items():
+            line += f', {counter} {value:g}'
+        return line
+
+    def _sample_memory(self, record: StageRecord, stop: threading.Event) -> None:
+        while not stop.wait(SAMPLE_INTERVAL):
+            record.sample()
+
+    def _show_progress(self, record: StageRecord, stop: threading.Event) -> None:
+        while not stop.wait(0.5):
+            # Only the innermost running stage gets shown, so nested stages don't fight over
+            # the line.
+            if self._active[-1:] != [record]:
+                continue
+            self._stream.write(f'\r{self._progress_line(record)}')
+            self._stream.flush()
+
+    def report(self) -> dict:
+        """
+        Returns the whole run's measurements.
+        """
+        return {'run': self.run_name,
+                'started': self._started.isoformat(),
+                'wall_seconds': time.perf_counter() - self._start_wall,
+                'peak_rss_mb': _peak_rss_mb(),
+                'children_peak_rss_mb': _peak_rss_mb(resource.RUSAGE_CHILDREN)
+                if resource is not None else None,
+                'stages': [record.to_dict() for record in self.stages]}
+
+    def write(self, directory: str = DEFAULT_PROFILE_DIR) -> str:
+        """
+        Writes the report as JSON into directory and returns the file's path.
+        """
+        os.makedirs(directory, exist_ok=True)
+        timestamp = self._started.strftime('%Y%m%dT%H%M%SZ')
+        path = os.path.join(directory, f'{self.run_name}-{timestamp}.json')
+        with open(path, 'w', encoding='utf-8') as report_file:
+            json.dump(self.report(), report_file, indent=2)
+        return path
+
+    def summary(self) -> str:
+        """
+        Returns a short table of every stage, for printing at the end of a run.
+        """
+        lines = [f'{"stage":<24}{"wall s":>10}{"cpu s":>10}{"peak MB":>10}{"workers MB":>12}'
+                 f'{"items":>10}']
+        for record in self.stages:
+            peak = f'{record.peak_rss_mb:.0f}' if record.peak_rss_mb is not None else '?'
+            workers = f'{record.children_peak_rss_mb:.0f}' \
+                if record.children_peak_rss_mb is not None else '?'
+            lines.append(f'{record.name:<24}{record.elapsed():>10.2f}'
+                         f'{(record.cpu_seconds or 0) + (record.children_cpu_seconds or 0):>10.2f}'
+                         f'{peak:>10}{workers:>12}{record.items:>10}')
+        return '\n'.join(lines)
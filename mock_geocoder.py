@@ -0,0 +1,150 @@
+"""
+A local stand-in for a reverse geocoding service, for trying out geocoding.py (and timing it in
+benchmark.py) without sending anything over the network. It answers /reverse requests in
+Nominatim's format (when asked with format=...) or Photon's (otherwise), giving the FSA of the
+nearest cell of synthetic_data.py's grid, and can be told to be slow or to fail now and then, to
+exercise the client's retries:
+
+    python mock_geocoder.py --port 8080 --latency 0.05 --failure-rate 0.1
+    GEOCODER_URL=http://localhost:8080 GEOCODER_RATE=500 GEOCODER_CONCURRENCY=32 python data_prep.py
+
+From Python, MockGeocoder runs the server on a background thread:
+
+    with MockGeocoder() as server:
+        postcodes, _ = reverse_geocode(coordinates, NominatimBackend(server.url, rate=1000))
+"""
+import argparse  # Library for reading command line options
+import asyncio  # Library for running the server
+import random  # Library for deciding which requests fail
+import threading  # Library for running the server in the background
+from typing import Callable
+from aiohttp import web  # Library for the HTTP server
+import synthetic_data
+
+
+def grid_postcode(latitude: float, longitude: float) -> str:
+    """
+    Returns a postcode in the synthetic_data.py grid cell nearest to a coordinate.
+    """
+    return synthetic_data.grid_names()[synthetic_data.cell_of(latitude, longitude)] + ' 1A1'
+
+
+class MockGeocoder:
+    """
+    A reverse geocoding server on localhost, running on its own thread.
+    """
+    # Instance attributes:
+    # - port: The port it listens on (0 picks a free one, see url once started)
+    # - latency: How long each answer takes, in seconds
+    # - failure_rate: The fraction of requests that get failure_status instead of an answer
+    # - failure_status: The status failed requests get: 503 (retried by the client) or e.g. 403
+    #   (a refusal, which isn't)
+    # - postcode_of: Works out the postcode of a (latitude, longitude)
+    # - requests: How many requests it has received
+    port: int
+    latency: float
+    failure_rate: float
+    failure_status: int
+    postcode_of: Callable[[float, float], str]
+    requests: int
+
+    def __init__(self, port: int = 0, latency: float = 0.0, failure_rate: float = 0.0,
+                 postcode_of: Callable[[float, float], str] = grid_postcode,
+                 seed: int = 0, failure_status: int = 503) -> None:
+        self.port = port
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.postcode_of = postcode_of
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/reverse', self._reverse)
+        return app
+
+    async def _reverse(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        if self._random.random() < self.failure_rate:
+            return web.Response(status=self.failure_status, headers={'Retry-After': '0'})
+
+        try:
+            latitude = float(request.query['lat'])
+            longitude = float(request.query['lon'])
+        except (KeyError, ValueError):
+            return web.json_response({'error': 'lat and lon are needed'}, status=400)
+
+        postcode = self.postcode_of(latitude, longitude)
+        if 'format' in request.query:  # Nominatim
+            answer = {'lat': str(latitude), 'lon': str(longitude), 'address': {}}
+            if postcode is not None:
+                answer['address']['postcode'] = postcode
+            return web.json_response(answer)
+        # Photon
+        properties = {'postcode': postcode} if postcode is not None else {}
+        return web.json_response({'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'properties': properties,
+             'geometry': {'type': 'Point', 'coordinates': [longitude, latitude]}}]})
+
+    async def _start_server(self) -> None:
+        self._runner = web.AppRunner(self.application())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    def start(self) -> 'MockGeocoder':
+        """
+        Starts the server on a background thread, and returns once it is accepting requests.
+        """
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start_server())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self) -> 'MockGeocoder':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local stand-in reverse geocoder.')
+    parser.add_argument('--port', type=int, default=8080, help='port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds each answer takes')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='fraction of requests that fail')
+    parser.add_argument('--failure-status', type=int, default=503,
+                        help='HTTP status failed requests get (503 is retried, 403 is not)')
+    args = parser.parse_args()
+
+    server = MockGeocoder(args.port, args.latency, args.failure_rate,
+                          failure_status=args.failure_status)
+    web.run_app(server.application(), host='127.0.0.1', port=args.port)
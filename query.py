@@ -0,0 +1,621 @@
+"""
+Ad hoc questions about the cleaned FSA data, without writing a loop over every FSA each time.
+A query is a few short expressions in Python syntax over the columns of an FSATable:
+
+    engine = QueryEngine()  # Reads cleaned_data.csv (through its snapshot)
+    engine.query(where='population > 20000 and unsuppressed(total_covid_cases_per_100)',
+                 select=['population', 'infractions_per_restaurant'])
+    engine.query(group_by='region',
+                 aggregates={'fsas': 'count()',
+                             'restaurants_per_1000': 'sum(number_of_restaurants) * 1000 '
+                                                     '/ sum(population)',
+                             'mean_cases': 'mean(total_covid_cases_per_100)'},
+                 order_by='-mean_cases')
+
+Every column name in FSA_COLUMNS and DERIVED_COLUMNS can be used, along with name (the FSA),
+district (its first character, e.g. M) and region (its first two, e.g. M4). Expressions are
+parsed with the ast module and only a small set of things is allowed (arithmetic, comparisons,
+and/or/not, in, and the functions in ROW_FUNCTIONS and AGGREGATE_FUNCTIONS), so nothing else
+in Python can be reached through them. Each one is turned into a tree of NumPy operations on whole
+columns at once, never a loop over rows. Like the rest of the project, suppressed values are NaN:
+comparisons with them are False, and aggregates skip them.
+
+Compiled expressions are kept in an LRU cache shared by every engine, and each engine keeps an LRU
+cache of query results. Before answering, the engine checks whether cleaned_data.csv has changed
+(by its size and modification time, which is one stat call), and if so reloads it and forgets
+every result, so a cached answer is never about old data.
+"""
+import argparse  # Library for reading command line options
+import ast  # Library for parsing expressions without running them
+from collections import OrderedDict  # Library for the LRU cache of results
+from functools import lru_cache  # Library for the LRU cache of compiled expressions
+import os  # Library for noticing when the data file changes
+from typing import Callable
+import numpy as np  # Library for evaluating expressions on whole columns at once
+import pandas as pd  # Library for handing back results as a nice table
+from FSA import FSATable, FSA_COLUMNS, DERIVED_COLUMNS
+from snapshot import DEFAULT_SOURCE_PATH, load_table
+
+# How many compiled expressions, and how many results per engine, are kept.
+COMPILED_CACHE_SIZE = 1024
+RESULT_CACHE_SIZE = 256
+
+
+class QueryError(ValueError):
+    """
+    Raised for an expression that can't be parsed, uses something that isn't allowed, or names a
+    column that doesn't exist.
+    """
+
+
+def _divide(numerator, denominator) -> np.ndarray:
+    """
+    Divides, giving NaN instead of a warning (or inf) wherever the denominator is 0, the same way
+    the derived columns do.
+    """
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator != 0, numerator / denominator, np.nan)
+
+
+def _unsuppressed(*columns) -> np.ndarray:
+    """
+    True where none of the columns are suppressed (NaN), like FSATable.unsuppressed.
+    """
+    mask = True
+    for column in columns:
+        column = np.asarray(column)
+        if column.dtype.kind == 'f':
+            mask = mask & ~np.isnan(column)
+    return mask
+
+
+# Functions that can be called in any expression. Each one works on whole columns.
+ROW_FUNCTIONS = {
+    'abs': np.abs,
+    'sqrt': np.sqrt,
+    'log': np.log,
+    'log10': np.log10,
+    'exp': np.exp,
+    'round': np.round,
+    'minimum': np.fmin,  # Elementwise, ignoring NaN if only one side is
+    'maximum': np.fmax,
+    'where': np.where,
+    'isnan': np.isnan,
+    'unsuppressed': _unsuppressed,
+    'startswith': lambda names, prefix: np.char.startswith(np.asarray(names, dtype=str), prefix),
+}
+
+# The binary operators allowed, and what they do. / is _divide, so x / 0 is NaN rather than inf.
+_BINARY_OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: _divide,
+    ast.FloorDiv: np.floor_divide,
+    ast.Mod: np.mod,
+    ast.Pow: np.power,
+}
+
+_COMPARISONS = {
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+}
+
+# Columns worked out from the FSA names, for grouping and filtering by area.
+NAME_COLUMNS = {
+    'name': lambda names: names,
+    'district': lambda names: np.char.ljust(names, 1).astype('<U1'),  # e.g. M
+    'region': lambda names: np.char.ljust(names, 2).astype('<U2'),  # e.g. M4
+}
+
+COLUMN_NAMES = [column_name for column_name, _, _ in FSA_COLUMNS] + list(DERIVED_COLUMNS) \
+    + list(NAME_COLUMNS)
+
+
+class Rows:
+    """
+    The rows of a table a query is looking at. Columns are fetched (or derived) the first time an
+    expression asks for them, and then kept for the rest of the query.
+    """
+    # Instance attributes:
+    # - table: The whole table
+    # - selection: The rows of table being looked at, or None for all of them
+    table: FSATable
+    selection: np.ndarray
+
+    def __init__(self, table: FSATable, selection: np.ndarray = None) -> None:
+        self.table = table
+        self.selection = selection
+        self._columns = {}
+
+    def __len__(self) -> int:
+        return len(self.table) if self.selection is None else len(self.selection)
+
+    def column(self, column_name: str) -> np.ndarray:
+        if column_name not in self._columns:
+            if column_name in NAME_COLUMNS:
+                column = NAME_COLUMNS[column_name](self.table.names)
+            else:
+                column = np.asarray(self.table[column_name])
+            self._columns[column_name] = column if self.selection is None \
+                else column[self.selection]
+        return self._columns[column_name]
+
+    def select(self, mask: np.ndarray) -> 'Rows':
+        """
+        Returns the rows where mask (lined up with these rows) is True.
+        """
+        rows = np.flatnonzero(mask)
+        return Rows(self.table, rows if self.selection is None else self.selection[rows])
+
+
+class Groups:
+    """
+    The rows of a query split into groups, as a group number for every row.
+    """
+    # Instance attributes:
+    # - rows: The rows being grouped
+    # - codes: The group each row belongs to, from 0 to count - 1
+    # - count: How many groups there are
+    rows: Rows
+    codes: np.ndarray
+    count: int
+
+    def __init__(self, rows: Rows, codes: np.ndarray, count: int) -> None:
+        self.rows = rows
+        self.codes = codes
+        self.count = count
+
+
+def _group_count(groups: Groups, values: np.ndarray = None) -> np.ndarray:
+    if values is None:
+        return np.bincount(groups.codes, minlength=groups.count)
+    present = ~np.isnan(np.asarray(values, dtype=np.float64))
+    return np.bincount(groups.codes[present], minlength=groups.count)
+
+
+def _group_sum(groups: Groups, values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values)
+    if values.dtype.kind in 'biu':  # Counts stay whole numbers
+        return np.bincount(groups.codes, weights=values.astype(np.float64),
+                           minlength=groups.count).round().astype(np.int64)
+    values = values.astype(np.float64)
+    return np.bincount(groups.codes, weights=np.nan_to_num(values, nan=0.0),
+                       minlength=groups.count)
+
+
+def _group_mean(groups: Groups, values: np.ndarray) -> np.ndarray:
+    return _divide(_group_sum(groups, values), _group_count(groups, values))
+
+
+def _group_std(groups: Groups, values: np.ndarray) -> np.ndarray:
+    """
+    The sample standard deviation (n - 1) of each group.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    count = _group_count(groups, values)
+    deviations = values - _group_mean(groups, values)[groups.codes]
+    squares = _group_sum(groups, deviations * deviations)
+    return np.sqrt(_divide(squares, count - 1))
+
+
+def _group_extreme(groups: Groups, values: np.ndarray, reduce: np.ufunc,
+                   start: float) -> np.ndarray:
+    whole = np.asarray(values).dtype.kind in 'biu'
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    result = np.full(groups.count, start)
+    reduce.at(result, groups.codes[present], values[present])
+    if whole and np.isfinite(result).all():  # Every group has a value, so no NaN is needed
+        return result.astype(np.int64)
+    return np.where(_group_count(groups, values) > 0, result, np.nan)
+
+
+def _group_median(groups: Groups, values: np.ndarray) -> np.ndarray:
+    """
+    The median of each group: sort by (group, value) once, then read off the middle of each.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    codes = groups.codes[present]
+    values = values[present]
+    order = np.lexsort((values, codes))
+    values = values[order]
+    count = np.bincount(codes, minlength=groups.count)
+    starts = np.cumsum(count) - count
+    low = starts + np.maximum(count - 1, 0) // 2
+    high = starts + count // 2
+    if len(values) == 0:
+        return np.full(groups.count, np.nan)
+    low = np.minimum(low, len(values) - 1)
+    high = np.minimum(high, len(values) - 1)
+    return np.where(count > 0, (values[low] + values[high]) / 2, np.nan)
+
+
+# Functions that turn a column into one value per group. They can only be used in aggregates,
+# and every column in an aggregate has to be inside one of them.
+AGGREGATE_FUNCTIONS = {
+    'count': _group_count,  # count() counts rows, count(x) counts rows where x isn't NaN
+    'sum': _group_sum,
+    'mean': _group_mean,
+    'median': _group_median,
+    'std': _group_std,
+    'min': lambda groups, values: _group_extreme(groups, values, np.fmin, np.inf),
+    'max': lambda groups, values: _group_extreme(groups, values, np.fmax, -np.inf),
+}
+
+
+class Expression:
+    """
+    A compiled expression: a function that evaluates it on a Rows (or, for aggregates, a Groups),
+    giving one value per row (or group).
+    """
+    # Instance attributes:
+    # - source: The expression as it was written
+    # - aggregate: Whether it is evaluated once per group, rather than once per row
+    # - columns: The columns it uses
+    source: str
+    aggregate: bool
+    columns: frozenset[str]
+
+    def __init__(self, source: str, aggregate: bool, evaluate: Callable,
+                 columns: frozenset[str]) -> None:
+        self.source = source
+        self.aggregate = aggregate
+        self.columns = columns
+        self._evaluate = evaluate
+
+    def __repr__(self) -> str:
+        return f'Expression({self.source!r})'
+
+    def evaluate(self, rows_or_groups) -> np.ndarray:
+        """
+        Returns the expression's value for every row of a Rows (or every group of a Groups), as
+        an array, even where the expression is a constant.
+        """
+        length = rows_or_groups.count if self.aggregate else len(rows_or_groups)
+        return np.broadcast_to(self._evaluate(rows_or_groups), (length,))
+
+
+class _Compiler:
+    """
+    Turns a parsed expression into nested closures over NumPy functions, refusing anything not
+    listed above. In aggregate mode, columns are only allowed inside an aggregate function, and
+    the closures above those take a Groups instead of a Rows.
+    """
+
+    def __init__(self, source: str, aggregate: bool) -> None:
+        self.source = source
+        self.aggregate = aggregate
+        self.columns = set()
+        self._inside_aggregate = False
+
+    def error(self, node: ast.AST, message: str) -> QueryError:
+        return QueryError(f'{message} in {self.source!r} (at column {node.col_offset + 1})')
+
+    def compile(self, node: ast.AST) -> Callable:
+        method = getattr(self, '_' + type(node).__name__, None)
+        if method is None:
+            raise self.error(node, f'{type(node).__name__} is not allowed')
+        return method(node)
+
+    def _Expression(self, node: ast.Expression) -> Callable:
+        return self.compile(node.body)
+
+    def _Constant(self, node: ast.Constant) -> Callable:
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float, str)):
+            raise self.error(node, f'The constant {node.value!r} is not allowed')
+        value = node.value
+        return lambda context: value
+
+    def _Name(self, node: ast.Name) -> Callable:
+        if node.id in ('nan', 'inf'):
+            value = float(node.id)
+            return lambda context: value
+        if node.id not in COLUMN_NAMES:
+            raise self.error(node, f'Unknown column {node.id!r}')
+        if self.aggregate and not self._inside_aggregate:
+            raise self.error(node, f'{node.id} has to be inside an aggregate function '
+                                   f'({", ".join(AGGREGATE_FUNCTIONS)})')
+        self.columns.add(node.id)
+        column_name = node.id
+        return lambda rows: rows.column(column_name)
+
+    def _BinOp(self, node: ast.BinOp) -> Callable:
+        operator = _BINARY_OPERATORS.get(type(node.op))
+        if operator is None:
+            raise self.error(node, f'The operator {type(node.op).__name__} is not allowed')
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+        return lambda context: operator(left(context), right(context))
+
+    def _UnaryOp(self, node: ast.UnaryOp) -> Callable:
+        operand = self.compile(node.operand)
+        if isinstance(node.op, ast.USub):
+            return lambda context: np.negative(operand(context))
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        if isinstance(node.op, ast.Not):
+            return lambda context: np.logical_not(operand(context))
+        raise self.error(node, f'The operator {type(node.op).__name__} is not allowed')
+
+    def _BoolOp(self, node: ast.BoolOp) -> Callable:
+        # Both sides are always evaluated: they're whole columns, so there's nothing to skip.
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        operands = [self.compile(value) for value in node.values]
+
+        def evaluate(context):
+            result = operands[0](context)
+            for operand in operands[1:]:
+                result = combine(result, operand(context))
+            return result
+        return evaluate
+
+    def _Compare(self, node: ast.Compare) -> Callable:
+        # a < b < c means a < b and b < c, with b only evaluated once.
+        parts = [self.compile(node.left)]
+        comparisons = []
+        for operator, comparator in zip(node.ops, node.comparators):
+            if isinstance(operator, (ast.In, ast.NotIn)):
+                if not isinstance(comparator, (ast.Tuple, ast.List, ast.Set)):
+                    raise self.error(comparator, "'in' needs a list of values, e.g. "
+                                                 "region in ('M4', 'M5')")
+                choices = [self.compile(element) for element in comparator.elts]
+                negate = isinstance(operator, ast.NotIn)
+                parts.append(lambda context, choices=choices: [choice(context)
+                                                               for choice in choices])
+                comparisons.append(
+                    lambda values, options, negate=negate:
+                        np.isin(values, np.asarray(options), invert=negate))
+                continue
+            function = _COMPARISONS.get(type(operator))
+            if function is None:
+                raise self.error(node, f'The comparison {type(operator).__name__} '
+                                       f'is not allowed')
+            parts.append(self.compile(comparator))
+            comparisons.append(function)
+
+        def evaluate(context):
+            left = parts[0](context)
+            result = True
+            for comparison, part in zip(comparisons, parts[1:]):
+                right = part(context)
+                result = np.logical_and(result, comparison(left, right))
+                left = right
+            return result
+        return evaluate
+
+    def _Call(self, node: ast.Call) -> Callable:
+        if not isinstance(node.func, ast.Name):
+            raise self.error(node, 'Only plain function calls are allowed')
+        if len(node.keywords) > 0:
+            raise self.error(node, 'Keyword arguments are not allowed')
+        function_name = node.func.id
+
+        if function_name in AGGREGATE_FUNCTIONS:
+            if not self.aggregate:
+                raise self.error(node, f'{function_name}() can only be used in aggregates')
+            if self._inside_aggregate:
+                raise self.error(node, f'{function_name}() can\'t be inside another aggregate')
+            if len(node.args) > 1 or (len(node.args) == 0 and function_name != 'count'):
+                raise self.error(node, f'{function_name}() takes one column expression')
+            self._inside_aggregate = True
+            argument = self.compile(node.args[0]) if len(node.args) > 0 else None
+            self._inside_aggregate = False
+            reduce = AGGREGATE_FUNCTIONS[function_name]
+            if argument is None:
+                return lambda groups: reduce(groups)
+            return lambda groups: reduce(groups, np.broadcast_to(argument(groups.rows),
+                                                                 (len(groups.rows),)))
+
+        function = ROW_FUNCTIONS.get(function_name)
+        if function is None:
+            raise self.error(node, f'Unknown function {function_name!r}')
+        arguments = [self.compile(argument) for argument in node.args]
+        return lambda context: function(*(argument(context) for argument in arguments))
+
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def compile_expression(source: str, aggregate: bool = False) -> Expression:
+    """
+    Compiles an expression over the columns (see the top of this file). With aggregate, it is
+    compiled to give one value per group, and every column has to be inside an aggregate
+    function, e.g. 'sum(number_of_restaurants) / count()'. Raises QueryError if it isn't allowed.
+    """
+    try:
+        tree = ast.parse(source.strip(), mode='eval')
+    except SyntaxError as error:
+        raise QueryError(f'Can\'t parse {source!r}: {error.msg}') from None
+    compiler = _Compiler(source, aggregate)
+    return Expression(source, aggregate, compiler.compile(tree), frozenset(compiler.columns))
+
+
+def _named(expressions) -> dict[str, str]:
+    """
+    Returns {output column name: expression} from a list of expressions (each named after
+    itself) or a dict.
+    """
+    if expressions is None:
+        return {}
+    if isinstance(expressions, str):
+        expressions = [expressions]
+    if isinstance(expressions, dict):
+        return dict(expressions)
+    return {expression: expression for expression in expressions}
+
+
+def run_query(table: FSATable, where: str = None, select=None, group_by: str = None,
+              aggregates=None, order_by: str = None, limit: int = None) -> pd.DataFrame:
+    """
+    Answers one query about table, without any caching of results (see QueryEngine for that).
+
+    - where: keep only the rows where this expression is True
+    - select: expressions to show for every row, as a list or {name: expression} (by default
+      every stored column). Ignored when grouping.
+    - group_by: an expression to split the rows by, e.g. 'region'
+    - aggregates: expressions to work out per group (or over all the rows, without group_by),
+      as a list or {name: expression}, e.g. {'fsas': 'count()'}
+    - order_by: an output column to sort by, with a - in front for biggest first
+    - limit: keep only this many rows of the result
+    """
+    rows = Rows(table)
+    if where is not None:
+        rows = rows.select(compile_expression(where).evaluate(rows).astype(bool))
+
+    if group_by is not None or aggregates is not None:
+        aggregates = _named(aggregates) or {'count': 'count()'}
+        compiled = {output: compile_expression(expression, aggregate=True)
+                    for output, expression in aggregates.items()}
+        if group_by is not None:
+            keys, codes = np.unique(compile_expression(group_by).evaluate(rows),
+                                    return_inverse=True)
+            groups = Groups(rows, codes.reshape(-1), len(keys))
+            results = {group_by: keys}
+        else:
+            groups = Groups(rows, np.zeros(len(rows), dtype=np.int64), 1)
+            results = {}
+        for output, expression in compiled.items():
+            results[output] = expression.evaluate(groups)
+        frame = pd.DataFrame(results)
+    else:
+        select = _named(select) or {column_name: column_name
+                                    for column_name, _, _ in FSA_COLUMNS}
+        results = {'FSA': rows.column('name')}
+        for output, expression in select.items():
+            results[output] = compile_expression(expression).evaluate(rows)
+        frame = pd.DataFrame(results)
+
+    if order_by is not None:
+        column = order_by.lstrip('-')
+        if column not in frame.columns:
+            raise QueryError(f'Can\'t order by {column!r}, it isn\'t in the result')
+        frame = frame.sort_values(column, ascending=not order_by.startswith('-'),
+                                  na_position='last', kind='stable')
+    if limit is not None:
+        frame = frame.head(limit)
+    return frame.reset_index(drop=True)
+
+
+def _freeze(expressions):
+    """
+    Returns select or aggregates in a form that can be a dict key.
+    """
+    if expressions is None or isinstance(expressions, str):
+        return expressions
+    if isinstance(expressions, dict):
+        return tuple(expressions.items())
+    return tuple(expressions)
+
+
+class QueryEngine:
+    """
+    Answers queries (see run_query) about the data in a cleaned_data.csv, or about a table given
+    directly, keeping the most recent RESULT_CACHE_SIZE results. With a source path, every query
+    first checks whether the file has changed, and if it has, reloads it and empties the cache.
+    A table given directly is never reloaded; call set_table after changing it.
+    """
+    # Instance attributes:
+    # - source_path: The csv the data comes from, or None if it was given as a table
+    # - table: The data queries are answered from
+    # - cache_size: The most results kept
+    # - hits: Queries answered from the cache
+    # - misses: Queries that had to be worked out
+    source_path: str
+    table: FSATable
+    cache_size: int
+    hits: int
+    misses: int
+
+    def __init__(self, source_path: str = DEFAULT_SOURCE_PATH, table: FSATable = None,
+                 cache_size: int = RESULT_CACHE_SIZE) -> None:
+        self.source_path = source_path if table is None else None
+        self.table = table
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._signature = None
+
+    def set_table(self, table: FSATable) -> None:
+        """
+        Answers queries from table from now on, forgetting every cached result.
+        """
+        self.table = table
+        self.source_path = None
+        self._results.clear()
+
+    def refresh(self) -> None:
+        """
+        Reloads the data (and empties the cache) if the source file changed since it was loaded.
+        """
+        if self.source_path is None:
+            return
+        stat = os.stat(self.source_path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if signature != self._signature or self.table is None:
+            self.table = load_table(self.source_path)
+            self._signature = signature
+            self._results.clear()
+
+    def query(self, where: str = None, select=None, group_by: str = None, aggregates=None,
+              order_by: str = None, limit: int = None) -> pd.DataFrame:
+        """
+        Returns the answer to a query (see run_query for what each part means), from the cache if
+        the same query was asked about the same data before.
+        """
+        self.refresh()
+        key = (where, _freeze(select), group_by, _freeze(aggregates), order_by, limit)
+        if key in self._results:
+            self._results.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._results[key] = run_query(self.table, where, select, group_by, aggregates,
+                                           order_by, limit)
+            if len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+        # A copy, so changing the answer doesn't change what's cached.
+        return self._results[key].copy()
+
+    def cache_info(self) -> dict:
+        """
+        Returns how well the result and compiled expression caches are doing.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'results': len(self._results),
+                'cache_size': self.cache_size, 'compiled': compile_expression.cache_info()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ask a question about the cleaned FSA data.')
+    parser.add_argument('--data', default=DEFAULT_SOURCE_PATH, help='the cleaned data csv')
+    parser.add_argument('--where', help="keep rows where this is true, e.g. 'population > 20000'")
+    parser.add_argument('--select', action='append', metavar='[NAME=]EXPRESSION',
+                        help='a column to show (can be given more than once)')
+    parser.add_argument('--group-by', help="split the rows by this, e.g. 'region'")
+    parser.add_argument('--aggregate', action='append', metavar='[NAME=]EXPRESSION',
+                        help="a value per group, e.g. 'cases=mean(total_covid_cases_per_100)' "
+                             '(can be given more than once)')
+    parser.add_argument('--order-by', help='output column to sort by (- in front for descending)')
+    parser.add_argument('--limit', type=int, help='how many rows to show')
+    args = parser.parse_args()
+
+    def split_names(expressions: list[str]) -> dict[str, str]:
+        named = {}
+        for expression in expressions or []:
+            # NAME=expression, but not a comparison like population==0
+            name, equals, rest = expression.partition('=')
+            if equals and name.strip().isidentifier() and not rest.startswith('='):
+                named[name.strip()] = rest
+            else:
+                named[expression] = expression
+        return named or None
+
+    print(QueryEngine(args.data).query(args.where, split_names(args.select), args.group_by,
+                                       split_names(args.aggregate), args.order_by,
+                                       args.limit).to_string())
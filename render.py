@@ -0,0 +1,185 @@
+"""
+Renders every graph in figures.py to files, without opening a browser or needing a display.
+This is what the nightly report job runs, instead of main.py:
+
+    python render.py --output-dir report
+    python render.py --output-dir report --format png --workers 4
+
+The graphs are built in a pool of worker processes. Each output directory gets a manifest.json
+listing every graph's file and fit, and a graph is only re-rendered if its spec, the data, or the
+output format changed since the last render. HTML output shares one copy of plotly.js
+(plotly.min.js, next to the graphs) unless --embed-plotlyjs is given. Image formats (png, svg,
+pdf) need the kaleido library.
+"""
+import argparse  # Library for reading command line options
+from concurrent.futures import ProcessPoolExecutor  # Library for rendering in parallel
+import hashlib  # Library for fingerprinting what went into each graph
+import json  # Library for reading and writing the manifest
+import os  # Library for working with files and directories
+from analysis import correlate
+from instrumentation import Profiler
+from figures import FIGURES, figure_pairs, build_figure
+from snapshot import load_table
+from stage_cache import file_digest
+
+DEFAULT_OUTPUT_DIR = 'figures'
+IMAGE_FORMATS = ('png', 'svg', 'pdf')
+
+# Bump this whenever the way graphs are drawn changes, so old renders stop being reused.
+RENDER_VERSION = 1
+
+# Each worker process loads the data once and keeps it here.
+_worker_table = None
+
+
+def _load_worker_table(source_path: str) -> None:
+    """
+    Runs once in each worker process, loading the data (memory-mapped from the snapshot if it's
+    up to date, so this is cheap).
+    """
+    global _worker_table
+    _worker_table = load_table(source_path, refresh=False)
+
+
+def _render_one(name: str, spec: dict, fit: dict, path: str, file_format: str,
+                include_plotlyjs) -> str:
+    """
+    Builds one graph and writes it to path. Runs inside a worker process.
+    """
+    fig = build_figure(_worker_table, spec, fit)
+    if file_format == 'html':
+        fig.write_html(path, include_plotlyjs=include_plotlyjs, full_html=True)
+    else:
+        fig.write_image(path, format=file_format)
+    return name
+
+
+def _plain(value):
+    """
+    Turns a NumPy scalar into a plain Python value that json can write. NaN becomes None.
+    """
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _fingerprint(spec: dict, data_digest: str, file_format: str, embed_plotlyjs: bool) -> str:
+    """
+    Returns a hash of everything that goes into a rendered graph.
+    """
+    contents = json.dumps({'spec': spec, 'data': data_digest, 'format': file_format,
+                           'embed_plotlyjs': embed_plotlyjs, 'version': RENDER_VERSION},
+                          sort_keys=True)
+    return hashlib.sha256(contents.encode('utf-8')).hexdigest()
+
+
+def render(output_dir: str = DEFAULT_OUTPUT_DIR, source_path: str = 'cleaned_data.csv',
+           file_format: str = 'html', names: list[str] = None, workers: int = None,
+           force: bool = False, embed_plotlyjs: bool = False,
+           profiler: Profiler = None) -> dict:
+    """
+    Renders the graphs in FIGURES (or just the ones in names) from the data in source_path into
+    output_dir, and returns the manifest. Graphs whose inputs haven't changed since the last
+    render are skipped, unless force is set. Loading and fitting, and drawing, are timed as two
+    stages of profiler (a new one if not given).
+    """
+    profiler = profiler or Profiler('render')
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, 'manifest.json')
+    manifest = {'figures': {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+
+    figures = {name: FIGURES[name] for name in (names if names is not None else FIGURES)}
+    with profiler.stage('load_and_fit') as stage:
+        data_digest = file_digest(source_path)
+        table = load_table(source_path)
+
+        # Fit every graph's trendline in one go, in this process, before handing out the drawing.
+        results = correlate(table, figure_pairs(figures))
+        fits = {}
+        for name, spec in figures.items():
+            row = results[(results['x'] == spec['x']) & (results['y'] == spec['y'])].iloc[0]
+            fits[name] = {column: _plain(row[column]) for column in results.columns}
+        stage.add_items(len(figures))
+
+    # HTML graphs point at one shared copy of plotly.js, instead of each carrying its own 3MB.
+    include_plotlyjs = True if embed_plotlyjs else 'directory'
+    if file_format == 'html' and not embed_plotlyjs:
+        plotlyjs_path = os.path.join(output_dir, 'plotly.min.js')
+        if not os.path.exists(plotlyjs_path):
+            from plotly.offline import get_plotlyjs
+            with open(plotlyjs_path, 'w', encoding='utf-8') as plotlyjs_file:
+                plotlyjs_file.write(get_plotlyjs())
+
+    # Work out which graphs actually need drawing.
+    jobs = []
+    for name, spec in figures.items():
+        fingerprint = _fingerprint(spec, data_digest, file_format, embed_plotlyjs)
+        path = os.path.join(output_dir, f'{name}.{file_format}')
+        previous = manifest['figures'].get(name)
+        if not force and previous is not None and previous['fingerprint'] == fingerprint \
+                and os.path.exists(path):
+            continue
+        jobs.append((name, spec, fits[name], path, file_format, include_plotlyjs))
+        manifest['figures'][name] = {'file': os.path.basename(path), 'fingerprint': fingerprint,
+                                     'title': spec['title'], 'x': spec['x'], 'y': spec['y'],
+                                     'fit': fits[name]}
+
+    print(f'Rendering {len(jobs)} of {len(figures)} graphs '
+          f'({len(figures) - len(jobs)} unchanged since last render)')
+    with profiler.stage('render') as stage:
+        if len(jobs) == 1 or workers == 1:
+            # Not worth starting up worker processes for.
+            _load_worker_table(source_path)
+            for job in jobs:
+                _render_one(*job)
+                stage.add_items()
+        elif len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_load_worker_table,
+                                     initargs=(source_path,)) as pool:
+                # Collecting the results makes any error in a worker show up here.
+                for _ in pool.map(_render_one, *zip(*jobs)):
+                    stage.add_items()
+
+    manifest['data_sha256'] = data_digest
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description='Render every graph to files, headlessly.')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR,
+                        help='where to write the graphs and manifest.json')
+    parser.add_argument('--data', default='cleaned_data.csv', help='the cleaned data csv')
+    parser.add_argument('--format', default='html', choices=('html',) + IMAGE_FORMATS,
+                        help='output file format (images need kaleido)')
+    parser.add_argument('--figure', action='append', choices=list(FIGURES), dest='names',
+                        help='only render this graph (can be given more than once)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: one per core)')
+    parser.add_argument('--force', action='store_true',
+                        help='re-render every graph, even unchanged ones')
+    parser.add_argument('--embed-plotlyjs', action='store_true',
+                        help='put a copy of plotly.js in every HTML file instead of sharing one')
+    parser.add_argument('--live', action='store_true',
+                        help='show a live progress line while each stage runs')
+    parser.add_argument('--profile-dir', default='profiles',
+                        help='where to write the timing report')
+    args = parser.parse_args(argv)
+
+    profiler = Profiler('render', live=args.live or None)
+    render(output_dir=args.output_dir, source_path=args.data, file_format=args.format,
+           names=args.names, workers=args.workers, force=args.force,
+           embed_plotlyjs=args.embed_plotlyjs, profiler=profiler)
+    print(profiler.summary())
+    print(f'Profile written to {profiler.write(args.profile_dir)}')
+
+
+if __name__ == '__main__':
+    main()
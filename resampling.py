@@ -0,0 +1,159 @@
+"""
+Checks how much the trendlines in main.py's graphs can actually be trusted. With only ~96 FSAs
+(fewer once suppressed values are dropped), eyeballing r² on a trendline isn't enough, so for each
+(x, y) pair this works out:
+
+- bootstrap confidence intervals for the slope and the correlation, by refitting the line on
+  thousands of resamples of the FSAs drawn with replacement, and
+- a permutation test p-value, by shuffling y thousands of times and counting how often the
+  shuffled data correlates at least as strongly as the real data.
+
+All the resamples for a pair are drawn as one big matrix of row indices and fitted together with
+NumPy, and the pairs are spread across worker processes. Results only depend on the seed, not on
+how many workers are used. To run it on the graphs in figures.py:
+
+    python resampling.py --resamples 10000 --seed 0
+"""
+import argparse  # Library for reading command line options
+from concurrent.futures import ProcessPoolExecutor  # Library for running pairs in parallel
+import numpy as np  # Library for drawing and fitting all the resamples at once
+import pandas as pd  # Library for handing back the results as a nice table
+from analysis import fit_rows
+from FSA import FSATable
+
+RESULT_COLUMNS = ['x', 'y', 'n', 'slope', 'slope_low', 'slope_high', 'r', 'r_low', 'r_high',
+                  'permutation_p']
+
+# Roughly how many numbers each batch of resamples may hold, to keep memory in check for big n.
+_BATCH_ELEMENTS = 4_000_000
+
+
+def _fit_batches(x: np.ndarray, y: np.ndarray, index_batches) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fits y against x for every resample in index_batches, a sequence of (x indices, y indices)
+    pairs of index matrices where each row picks which points go into one resample. Returns the
+    slopes and correlations of all the resamples.
+    """
+    slopes = []
+    correlations = []
+    for x_indices, y_indices in index_batches:
+        _, slope, _, r = fit_rows(x[x_indices], y[y_indices],
+                                  np.ones(y_indices.shape, dtype=bool))
+        slopes.append(slope)
+        correlations.append(r)
+    return np.concatenate(slopes), np.concatenate(correlations)
+
+
+def _batch_sizes(n_resamples: int, n: int) -> list[int]:
+    """
+    Splits n_resamples into batches small enough to stay under _BATCH_ELEMENTS numbers each.
+    """
+    per_batch = max(1, _BATCH_ELEMENTS // max(1, n))
+    return [min(per_batch, n_resamples - start) for start in range(0, n_resamples, per_batch)]
+
+
+def resample_pair(x: np.ndarray, y: np.ndarray, n_resamples: int = 10_000,
+                  seed=0, confidence: float = 0.95) -> dict:
+    """
+    Returns the bootstrap confidence intervals and permutation p-value for one pair of columns.
+    Entries where either column is NaN are dropped first. seed can be anything
+    np.random.default_rng accepts, including a SeedSequence.
+    """
+    known = np.isfinite(x) & np.isfinite(y)
+    x = np.asarray(x[known], dtype=np.float64)
+    y = np.asarray(y[known], dtype=np.float64)
+    n = x.shape[0]
+
+    _, slope, _, r = fit_rows(x[None, :], y[None, :], np.ones((1, n), dtype=bool))
+    result = {'n': n, 'slope': slope[0], 'r': r[0]}
+    if n < 3:
+        result.update(slope_low=np.nan, slope_high=np.nan, r_low=np.nan, r_high=np.nan,
+                      permutation_p=np.nan)
+        return result
+
+    # A fresh copy of the seed, so calling this twice with the same SeedSequence gives the same
+    # answer (spawning children changes a SeedSequence).
+    if isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key)
+    else:
+        seed = np.random.SeedSequence(seed)
+    bootstrap_rng, permutation_rng = [np.random.default_rng(child) for child in seed.spawn(2)]
+    sizes = _batch_sizes(n_resamples, n)
+
+    # Bootstrap: every row of the index matrix is one resample of the FSAs, with replacement.
+    # The same rows are picked from x and y, so points stay paired up.
+    def bootstrap_batches():
+        for size in sizes:
+            indices = bootstrap_rng.integers(0, n, size=(size, n))
+            yield indices, indices
+
+    boot_slopes, boot_r = _fit_batches(x, y, bootstrap_batches())
+    tail = 100 * (1 - confidence) / 2
+    result['slope_low'], result['slope_high'] = np.nanpercentile(boot_slopes, [tail, 100 - tail])
+    result['r_low'], result['r_high'] = np.nanpercentile(boot_r, [tail, 100 - tail])
+
+    # Permutation test: every row is a shuffled order of y against x in its original order,
+    # which breaks any link between the two.
+    ordered = np.arange(n)
+
+    def permutation_batches():
+        for size in sizes:
+            shuffled = permutation_rng.permuted(np.tile(ordered, (size, 1)), axis=1)
+            yield np.broadcast_to(ordered, (size, n)), shuffled
+
+    _, perm_r = _fit_batches(x, y, permutation_batches())
+    extreme = np.count_nonzero(np.abs(perm_r) >= abs(r[0]) - 1e-12)
+    # The +1s count the real data as one of the permutations, so p is never exactly 0.
+    result['permutation_p'] = (extreme + 1) / (n_resamples + 1)
+    return result
+
+
+def _resample_job(job: tuple) -> dict:
+    """
+    Runs resample_pair for one pair inside a worker process.
+    """
+    x, y, n_resamples, seed, confidence = job
+    return resample_pair(x, y, n_resamples, seed, confidence)
+
+
+def resample(table: FSATable, pairs: list[tuple[str, str]] = None, n_resamples: int = 10_000,
+             seed: int = 0, confidence: float = 0.95, workers: int = None) -> pd.DataFrame:
+    """
+    Returns a table with the bootstrap confidence intervals (for the slope and the Pearson
+    correlation) and permutation p-value of every (x, y) pair in pairs, by default every graph in
+    figures.py. Each pair gets its own random stream split off from seed, so results are the same
+    however many workers are used.
+    """
+    if pairs is None:
+        from figures import figure_pairs  # Only needed here, and pulls in plotly
+        pairs = figure_pairs()
+
+    seeds = np.random.SeedSequence(seed).spawn(len(pairs))
+    jobs = [(table[x_name], table[y_name], n_resamples, pair_seed, confidence)
+            for (x_name, y_name), pair_seed in zip(pairs, seeds)]
+
+    if workers == 1 or len(jobs) <= 1:
+        results = [_resample_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_resample_job, jobs))
+
+    rows = [dict(result, x=x_name, y=y_name) for (x_name, y_name), result in zip(pairs, results)]
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+if __name__ == '__main__':
+    from snapshot import load_table
+
+    parser = argparse.ArgumentParser(description='Bootstrap and permutation tests for every '
+                                                 'graph in figures.py.')
+    parser.add_argument('--data', default='cleaned_data.csv', help='the cleaned data csv')
+    parser.add_argument('--resamples', type=int, default=10_000, help='resamples per pair')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--confidence', type=float, default=0.95, help='confidence level')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: one per core)')
+    args = parser.parse_args()
+
+    print(resample(load_table(args.data), n_resamples=args.resamples, seed=args.seed,
+                   confidence=args.confidence, workers=args.workers).to_string())
@@ -0,0 +1,95 @@
+"""
+A binary snapshot of cleaned_data.csv, so main.py doesn't have to parse the csv (and convert every
+field with int()/float()) every time it starts. The snapshot is a directory holding one .npy file
+per column, plus a meta.json describing it. Loading it memory-maps the .npy files, so the data is
+only actually read from disk when it is used.
+
+meta.json records the schema version and the size, modification time and SHA-256 hash of the csv
+the snapshot was built from. If the csv changes, the snapshot is no longer trusted and the csv is
+read instead.
+"""
+import json  # Library for reading meta.json
+import os  # Library for working with files and directories
+import numpy as np  # Library for saving and memory-mapping the columns
+from FSA import FSATable, FSA_COLUMNS
+from stage_cache import invalidate, is_fresh, source_info, write_json
+
+DEFAULT_SOURCE_PATH = 'cleaned_data.csv'
+
+# Bump this whenever the layout of a snapshot changes, so old snapshots get rebuilt.
+SCHEMA_VERSION = 1
+
+
+def snapshot_path(source_path: str) -> str:
+    """
+    Returns where the snapshot of the csv at source_path lives, e.g. cleaned_data.snapshot.
+    """
+    return os.path.splitext(source_path)[0] + '.snapshot'
+
+
+def write_snapshot(table: FSATable, source_path: str = DEFAULT_SOURCE_PATH,
+                   directory: str = None) -> None:
+    """
+    Writes a snapshot of table, recording that it was built from the csv at source_path.
+    """
+    if directory is None:
+        directory = snapshot_path(source_path)
+    os.makedirs(directory, exist_ok=True)
+
+    meta_path = os.path.join(directory, 'meta.json')
+    invalidate(meta_path)
+
+    np.save(os.path.join(directory, 'FSA.npy'), table.names)
+    for column_name, _, _ in FSA_COLUMNS:
+        np.save(os.path.join(directory, column_name + '.npy'), table.columns[column_name])
+
+    meta = {'schema_version': SCHEMA_VERSION,
+            'source': source_info(source_path),
+            'rows': len(table),
+            'columns': [column_name for column_name, _, _ in FSA_COLUMNS]}
+    write_json(meta_path, meta)
+
+
+def read_snapshot(source_path: str = DEFAULT_SOURCE_PATH, directory: str = None) -> FSATable:
+    """
+    Returns the table stored in the snapshot of the csv at source_path, with every column
+    memory-mapped, or None if there is no snapshot or it is out of date.
+    """
+    if directory is None:
+        directory = snapshot_path(source_path)
+    meta_path = os.path.join(directory, 'meta.json')
+    if not os.path.exists(meta_path) or not os.path.exists(source_path):
+        return None
+
+    with open(meta_path, encoding='utf-8') as meta_file:
+        meta = json.load(meta_file)
+    if meta.get('schema_version') != SCHEMA_VERSION:
+        return None
+    if meta['columns'] != [column_name for column_name, _, _ in FSA_COLUMNS]:
+        return None
+    if not is_fresh(meta, source_path, meta_path):
+        return None
+
+    names = np.load(os.path.join(directory, 'FSA.npy'), mmap_mode='r')
+    columns = {column_name: np.load(os.path.join(directory, column_name + '.npy'), mmap_mode='r')
+               for column_name in meta['columns']}
+    return FSATable(names, columns)
+
+
+def load_table(source_path: str = DEFAULT_SOURCE_PATH, refresh: bool = True) -> FSATable:
+    """
+    Returns the data in the csv at source_path, from its snapshot if that is up to date, or from
+    the csv itself if not. With refresh, a new snapshot is written after falling back to the csv,
+    so the next load is fast again.
+    """
+    table = read_snapshot(source_path)
+    if table is not None:
+        return table
+
+    table = FSATable.from_csv(source_path)
+    if refresh:
+        try:
+            write_snapshot(table, source_path)
+        except OSError:
+            pass  # Not being able to cache is no reason to fail; the csv was read fine.
+    return table
@@ -0,0 +1,182 @@
+"""
+Remembers the result of each data_prep.py stage, along with a fingerprint of the input files it
+was computed from. If a stage's inputs haven't changed since last time, its stored result is used
+instead of doing the work again. This way a new DineSafe drop doesn't mean re-reading the ICES
+workbook, and a run where nothing changed at all finishes almost instantly.
+
+Results are stored as JSON in the .prep_cache directory, one file per stage.
+"""
+import hashlib  # Library for hashing the contents of input files
+import json  # Library for storing stage results on disk
+import os  # Library for working with files and directories
+from typing import Callable
+
+DEFAULT_CACHE_DIR = '.prep_cache'
+
+# Bump this whenever a stage starts producing differently shaped results, so old stored results
+# stop being trusted.
+CACHE_VERSION = 1
+
+
+def file_digest(path: str) -> str:
+    """
+    Returns the SHA-256 hex digest of the file at path, reading it a block at a time.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _stat_signature(path: str) -> list:
+    """
+    Returns the size and modification time of a file, or None if it doesn't exist. Used to skip
+    rehashing files that obviously haven't been touched.
+    """
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def fingerprint(paths: list[str], previous: dict = None) -> dict:
+    """
+    Returns {path: [size, mtime, digest]} for each input file (or None for missing files). If a
+    previous fingerprint is given, the digest of any file whose size and modification time still
+    match is reused rather than recomputed.
+    """
+    previous = previous or {}
+    result = {}
+    for path in paths:
+        signature = _stat_signature(path)
+        if signature is None:
+            result[path] = None
+        elif previous.get(path) is not None and previous[path][:2] == signature:
+            result[path] = previous[path]
+        else:
+            result[path] = signature + [file_digest(path)]
+    return result
+
+
+def _same_contents(old: dict, new: dict) -> bool:
+    """
+    Checks whether two fingerprints describe the same file contents, ignoring modification times.
+    """
+    if old is None or set(old) != set(new):
+        return False
+    for path in new:
+        if (old[path] is None) != (new[path] is None):
+            return False
+        if new[path] is not None and old[path][2] != new[path][2]:
+            return False
+    return True
+
+
+class Incomplete:
+    """
+    Wraps a stage result that is usable for this run but shouldn't be stored, because part of it
+    is missing for reasons that aren't in the input files (e.g. the geocoder was down). Returning
+    one from compute makes run_stage hand back the result without saving it, so the next run
+    tries again even though the inputs haven't changed.
+    """
+    # Instance attributes:
+    # - result: The stage's result
+    # - reason: Why it isn't complete, for the message
+    result: object
+    reason: str
+
+    def __init__(self, result: object, reason: str) -> None:
+        self.result = result
+        self.reason = reason
+
+
+def run_stage(name: str, inputs: list[str], compute: Callable[[], object],
+              cache_dir: str = DEFAULT_CACHE_DIR) -> object:
+    """
+    Returns the result of compute(), a JSON-serializable value built from the files in inputs.
+    If the stage was last run on identical inputs, the stored result is returned instead and
+    compute is never called. If compute returns an Incomplete, its result is returned but not
+    stored.
+    """
+    cache_path = os.path.join(cache_dir, name + '.json')
+
+    stored = None
+    if os.path.exists(cache_path):
+        with open(cache_path, encoding='utf-8') as cache_file:
+            stored = json.load(cache_file)
+        if stored.get('version') != CACHE_VERSION:
+            stored = None
+
+    current = fingerprint(inputs, stored['inputs'] if stored is not None else None)
+    if stored is not None and _same_contents(stored['inputs'], current):
+        print(f'{name}: inputs unchanged, reusing stored result')
+        if stored['inputs'] != current:  # Only the modification times moved, so refresh them.
+            stored['inputs'] = current
+            write_json(cache_path, stored)
+        return stored['result']
+
+    print(f'{name}: inputs changed, recomputing')
+    result = compute()
+    if isinstance(result, Incomplete):
+        print(f'{name}: {result.reason}, so the result is not stored and will be redone next run')
+        return result.result
+    write_json(cache_path, {'version': CACHE_VERSION, 'inputs': current, 'result': result})
+    return result
+
+
+def write_json(path: str, contents: dict) -> None:
+    """
+    Writes contents to a JSON file. It is written to a temporary file first and then swapped in,
+    so a crash halfway through never leaves a broken file behind.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as json_file:
+        json.dump(contents, json_file)
+    os.replace(temporary_path, path)
+
+
+# The helpers below are shared by the files built from other files (snapshot.py's snapshot,
+# census.py's index, dashboard.py's simplified outlines). Each one keeps a meta.json saying what
+# it was built from. The meta.json is removed with invalidate before anything is rewritten, and
+# written with write_json last, so a half-written one never looks valid.
+
+def source_info(path: str, digest: str = None) -> dict:
+    """
+    Returns the size, modification time and SHA-256 hash of the file at path, to be kept as the
+    'source' of a meta.json. digest saves hashing the file again if it is already known.
+    """
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'sha256': digest if digest is not None else file_digest(path)}
+
+
+def is_fresh(meta: dict, path: str, meta_path: str = None) -> bool:
+    """
+    Checks whether the file at path still has the contents recorded in meta['source']. If its
+    size and modification time match, it hasn't been touched. Otherwise it is hashed, in case it
+    was only copied or touched; if the contents are the same, meta['source'] is brought up to date
+    (and written back to meta_path, if given) so the next check can skip the hash.
+    """
+    source = meta.get('source')
+    if source is None or not os.path.exists(path):
+        return False
+    stat = os.stat(path)
+    if stat.st_size == source['size'] and stat.st_mtime_ns == source['mtime_ns']:
+        return True
+    digest = file_digest(path)
+    if digest != source['sha256']:
+        return False
+    meta['source'] = source_info(path, digest)
+    if meta_path is not None:
+        write_json(meta_path, meta)
+    return True
+
+
+def invalidate(meta_path: str) -> None:
+    """
+    Removes a meta.json (if there is one), before the files it describes are rewritten.
+    """
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
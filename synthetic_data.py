@@ -0,0 +1,213 @@
+"""
+Makes up fake versions of every input file data_prep.py reads, at any size, so the pipeline can be
+run and timed without the real files (or the five-hour geocoding run). Everything is random but
+shaped like the real thing:
+
+- a DineSafe file (ds.xml) with establishments, inspections and infractions,
+- an ICES-style workbook with the two sheets and the header text ices.py looks for,
+- a census CSV laid out like T120120211212055123.CSV, footnotes and all,
+- a boundary GeoJSON that splits Toronto into a grid of square FSAs.
+
+A few establishments are placed just outside the grid on purpose, so the geocoding fallback has
+something to do. Every generator takes a seed, so the same arguments always give the same files.
+"""
+import csv  # Library for writing the census file
+import json  # Library for writing the boundary file
+import string  # Library for the letters in FSA names
+from xml.sax.saxutils import escape  # Library for making text safe to put in XML
+import numpy as np  # Library for drawing all the random numbers at once
+import openpyxl  # Library for writing the ICES-style workbook
+from dinesafe import MINOR, SIGNIFICANT, CRUCIAL
+
+# Roughly the size of the real data sets, which the scale factors multiply.
+TORONTO_ESTABLISHMENTS = 17_000
+CENSUS_ROWS = 1_650
+
+# How many different FSA names other_names can make up: any letter but M, a digit from 1 to 9
+# and any letter. FSA names are always three characters (census.py drops anything else), so
+# tables of FSAs can't be scaled up past this without repeating names.
+OTHER_FSAS = 25 * 9 * 26
+
+# The box the Toronto FSAs are spread over: (south, north, west, east).
+TORONTO_BOUNDS = (43.58, 43.86, -79.64, -79.11)
+
+# How the box is split into FSAs: 12 columns by 8 rows gives Toronto's 96.
+GRID_COLUMNS = 12
+GRID_ROWS = 8
+
+# How often each kind of infraction comes up, and how often an ICES value is suppressed.
+SEVERITY_WEIGHTS = {MINOR: 0.6, SIGNIFICANT: 0.3, CRUCIAL: 0.1}
+SUPPRESSED_FRACTION = 0.03
+
+# What fraction of establishments land just outside every FSA.
+OUTSIDE_FRACTION = 0.01
+
+
+def grid_names(prefix: str = 'M', count: int = GRID_COLUMNS * GRID_ROWS) -> list[str]:
+    """
+    Returns count made-up FSA names starting with prefix: M1A, M2A, ..., M9A, M1B, ...
+    """
+    letters = string.ascii_uppercase
+    return [f'{prefix}{1 + i % 9}{letters[i // 9 % 26]}' for i in range(count)]
+
+
+def other_names(count: int) -> list[str]:
+    """
+    Returns count different FSA names from outside Toronto (any letter but M). There are only
+    OTHER_FSAS of them, so asking for more raises ValueError.
+    """
+    if count > OTHER_FSAS:
+        raise ValueError(f'Only {OTHER_FSAS} FSA names outside Toronto exist, not {count}')
+    letters = [letter for letter in string.ascii_uppercase if letter != 'M']
+    per_letter = 9 * 26
+    return [f'{letters[i // per_letter]}{1 + i % 9}'
+            f'{string.ascii_uppercase[i // 9 % 26]}' for i in range(count)]
+
+
+def cell_of(latitude: float, longitude: float) -> int:
+    """
+    Returns which grid cell (FSA) a coordinate is in, clamping coordinates outside the box to
+    the nearest cell.
+    """
+    south, north, west, east = TORONTO_BOUNDS
+    column = int((longitude - west) / (east - west) * GRID_COLUMNS)
+    row = int((latitude - south) / (north - south) * GRID_ROWS)
+    column = min(max(column, 0), GRID_COLUMNS - 1)
+    row = min(max(row, 0), GRID_ROWS - 1)
+    return row * GRID_COLUMNS + column
+
+
+def write_boundaries(path: str) -> list[str]:
+    """
+    Writes a GeoJSON file with one square polygon per FSA in the grid, and returns their names.
+    """
+    south, north, west, east = TORONTO_BOUNDS
+    width = (east - west) / GRID_COLUMNS
+    height = (north - south) / GRID_ROWS
+    names = grid_names()
+    features = []
+    for cell, name in enumerate(names):
+        row, column = divmod(cell, GRID_COLUMNS)
+        left = west + column * width
+        bottom = south + row * height
+        ring = [[left, bottom], [left + width, bottom], [left + width, bottom + height],
+                [left, bottom + height], [left, bottom]]
+        features.append({'type': 'Feature', 'properties': {'CFSAUID': name},
+                         'geometry': {'type': 'Polygon', 'coordinates': [ring]}})
+    with open(path, 'w', encoding='utf-8') as boundaries_file:
+        json.dump({'type': 'FeatureCollection', 'features': features}, boundaries_file)
+    return names
+
+
+def write_dinesafe(path: str, establishments: int = TORONTO_ESTABLISHMENTS,
+                   infractions_per_establishment: float = 2.0, seed: int = 0,
+                   batch_size: int = 10_000) -> int:
+    """
+    Writes a DineSafe-style XML file with the given number of establishments, each with a random
+    (Poisson) number of infractions averaging infractions_per_establishment, spread over a couple
+    of inspections. Returns the total number of infractions written. The file is written a batch
+    at a time, so even 100x Toronto doesn't need much memory.
+    """
+    rng = np.random.default_rng(seed)
+    south, north, west, east = TORONTO_BOUNDS
+    severities = list(SEVERITY_WEIGHTS)
+    weights = np.array(list(SEVERITY_WEIGHTS.values()))
+    total_infractions = 0
+
+    with open(path, 'w', encoding='utf-8') as dinesafe_file:
+        dinesafe_file.write('<?xml version="1.0" encoding="UTF-8"?>\n<DINESAFE_DATA>\n')
+        for start in range(0, establishments, batch_size):
+            size = min(batch_size, establishments - start)
+            latitudes = rng.uniform(south, north, size)
+            longitudes = rng.uniform(west, east, size)
+            # Nudge a few just past the eastern edge, where no polygon will catch them.
+            outside = rng.random(size) < OUTSIDE_FRACTION
+            longitudes[outside] = east + rng.uniform(0.001, 0.01, outside.sum())
+            counts = rng.poisson(infractions_per_establishment, size)
+            kinds = rng.choice(len(severities), size=counts.sum(), p=weights)
+            total_infractions += int(counts.sum())
+
+            lines = []
+            position = 0
+            for i in range(size):
+                number = start + i
+                lines.append(f'<ESTABLISHMENT><ID>{10_000_000 + number}</ID>'
+                             f'<NAME>{escape(f"Restaurant & Grill #{number}")}</NAME>'
+                             f'<TYPE>Restaurant</TYPE><ADDRESS>{number} MAIN ST</ADDRESS>'
+                             f'<LATITUDE>{latitudes[i]:.6f}</LATITUDE>'
+                             f'<LONGITUDE>{longitudes[i]:.6f}</LONGITUDE><STATUS>Pass</STATUS>')
+                # Split the infractions between a first inspection and a follow-up.
+                first = counts[i] // 2
+                for inspection in (kinds[position:position + first],
+                                   kinds[position + first:position + counts[i]]):
+                    lines.append('<INSPECTION><DATE>2021-06-01</DATE>')
+                    for kind in inspection:
+                        lines.append(f'<INFRACTION><SEVERITY>{severities[kind]}</SEVERITY>'
+                                     f'<DEFICIENCY>Fail to maintain</DEFICIENCY></INFRACTION>')
+                    lines.append('</INSPECTION>')
+                position += counts[i]
+                lines.append('</ESTABLISHMENT>\n')
+            dinesafe_file.write(''.join(lines))
+        dinesafe_file.write('</DINESAFE_DATA>\n')
+    return total_infractions
+
+
+def write_ices(path: str, toronto_names: list[str], extra_rows: int = 0, seed: int = 0) -> None:
+    """
+    Writes an ICES-style workbook with a row for every Toronto FSA plus extra_rows FSAs from the
+    rest of Ontario (at most OTHER_FSAS), with a few values suppressed ('*') like the real thing.
+    """
+    rng = np.random.default_rng(seed)
+    names = list(toronto_names) + other_names(extra_rows)
+    workbook = openpyxl.Workbook(write_only=True)
+    notes = workbook.create_sheet('Terms of Reference')
+    notes.append(['Synthetic data for benchmarking. Not real.'])
+
+    for sheet_name, dose in (('At least 1 Dose  by FSA', 'at least 1 dose'),
+                             ('2 doses by FSA', '2 doses')):
+        sheet = workbook.create_sheet(sheet_name)
+        # The real sheets have a few title rows before the header.
+        sheet.append([f'COVID-19 vaccination coverage ({dose}) by FSA'])
+        sheet.append([])
+        sheet.append(['FSA', 'Public Health Unit', 'COVID-19 cases\n(per 100)',
+                      'COVID-19 hospitalizations\n(per 1,000)', 'COVID-19 deaths\n(per 1,000)',
+                      f'% Vaccinated with {dose}\n(All ages\nincluding <5 and undocumented age)',
+                      f'% Vaccinated with {dose}\n(Age 85+)'])
+        values = np.column_stack([rng.uniform(1, 10, len(names)),
+                                  rng.uniform(0.5, 5, len(names)),
+                                  rng.uniform(0, 1, len(names)),
+                                  rng.uniform(0.6, 0.95, len(names)),
+                                  rng.uniform(0.6, 0.95, len(names))])
+        suppressed = rng.random(values.shape) < SUPPRESSED_FRACTION
+        for name, row, hidden in zip(names, values, suppressed):
+            sheet.append([name, 'Public Health Unit'] +
+                         ['*' if hide else float(value) for value, hide in zip(row, hidden)])
+    workbook.save(path)
+
+
+def write_census(path: str, toronto_names: list[str], extra_rows: int = CENSUS_ROWS,
+                 seed: int = 0) -> None:
+    """
+    Writes a census CSV laid out like T120120211212055123.CSV: a header, a row for Canada, a row
+    per FSA (the Toronto ones plus extra_rows others, at most OTHER_FSAS), then a blank line and
+    footnotes (with a byte that isn't valid UTF-8, like the real one).
+    """
+    rng = np.random.default_rng(seed)
+    names = list(toronto_names) + other_names(extra_rows)
+    populations = rng.integers(1_000, 80_000, len(names))
+    dwellings = (populations * rng.uniform(0.35, 0.5, len(names))).astype(np.int64)
+    occupied = (dwellings * rng.uniform(0.85, 0.98, len(names))).astype(np.int64)
+
+    with open(path, 'w', newline='', encoding='latin-1') as census_file:
+        writer = csv.writer(census_file, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writerow(['Geographic code', 'Geographic name', 'Province or territory',
+                         'Incompletely enumerated Indian reserves and Indian settlements, 2016',
+                         'Population, 2016', 'Total private dwellings, 2016',
+                         'Private dwellings occupied by usual residents, 2016'])
+        writer.writerow(['01', 'Canada', '', 'T', int(populations.sum()), int(dwellings.sum()),
+                         int(occupied.sum())])
+        for name, population, total, used in zip(names, populations, dwellings, occupied):
+            province = 'Ontario' if name[0] in 'KLMNP' else 'Quebec'
+            writer.writerow([name, name, province, '', int(population), int(total), int(used)])
+        census_file.write('\n"Note: synthetic census data for benchmarking."\n')
+        census_file.write('"Statistique Canada, donn\xe9es fictives."\n')
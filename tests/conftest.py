@@ -0,0 +1,8 @@
+"""
+Lets the tests import the project's modules, which live in the repository root rather than in a
+package.
+"""
+import os  # Library for working out where the repository is
+import sys  # Library for changing where modules are imported from
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
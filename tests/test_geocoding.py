@@ -0,0 +1,80 @@
+"""
+Tests for geocoding.py's retries and failure handling, against mock_geocoder.py's local server.
+"""
+import random  # Library for picking coordinates
+import pytest  # Library for running the tests
+from data_prep import geocode_missing_FSAs
+from geocode_cache import GeocodeCache
+from geocoding import NominatimBackend, reverse_geocode
+from mock_geocoder import MockGeocoder, grid_postcode
+from synthetic_data import TORONTO_BOUNDS
+
+
+def coordinates(count: int, seed: int = 0) -> list[tuple[float, float]]:
+    """
+    Returns count random coordinates inside the synthetic grid.
+    """
+    south, north, west, east = TORONTO_BOUNDS
+    rng = random.Random(seed)
+    return [(round(rng.uniform(south, north), 5), round(rng.uniform(west, east), 5))
+            for _ in range(count)]
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    # geocode_missing_FSAs keeps its cache in the working directory.
+    monkeypatch.chdir(tmp_path)
+
+
+def test_retries_until_every_coordinate_is_answered():
+    points = coordinates(50)
+    with MockGeocoder(failure_rate=0.3, seed=1) as server:
+        backend = NominatimBackend(server.url, rate=10_000, concurrency=8)
+        postcodes, client = reverse_geocode(points, backend, max_retries=10, backoff=0)
+    assert postcodes == [grid_postcode(latitude, longitude) for latitude, longitude in points]
+    assert client.requests == len(points)
+    assert client.attempts > client.requests  # Some 503s were retried
+    assert client.attempts == server.requests
+    assert client.failures == 0
+
+
+def test_gives_up_after_max_retries():
+    points = coordinates(10)
+    with MockGeocoder(failure_rate=1.0) as server:
+        backend = NominatimBackend(server.url, rate=10_000, concurrency=8)
+        postcodes, client = reverse_geocode(points, backend, max_retries=2, backoff=0)
+    assert postcodes == [None] * len(points)
+    assert client.attempts == len(points) * 3
+    assert client.failures == len(points)
+
+
+def test_refused_requests_are_not_retried():
+    points = coordinates(10)
+    with MockGeocoder(failure_rate=1.0, failure_status=403) as server:
+        backend = NominatimBackend(server.url, rate=10_000, concurrency=8)
+        postcodes, client = reverse_geocode(points, backend, max_retries=5, backoff=0)
+    assert postcodes == [None] * len(points)
+    assert client.attempts == len(points)
+    assert client.failures == len(points)
+
+
+def test_failed_coordinates_stay_out_of_the_cache():
+    points = coordinates(40)
+    latitudes = [latitude for latitude, _ in points]
+    longitudes = [longitude for _, longitude in points]
+    establishment_FSAs = [''] * len(points)
+    with MockGeocoder(failure_rate=0.5, failure_status=403, seed=2) as server:
+        backend = NominatimBackend(server.url, rate=10_000, concurrency=8)
+        failures = geocode_missing_FSAs(latitudes, longitudes, establishment_FSAs,
+                                        backend=backend)
+    assert 0 < failures < len(points)
+    assert establishment_FSAs.count('') == failures
+
+    cache = GeocodeCache()
+    for latitude, longitude, fsa in zip(latitudes, longitudes, establishment_FSAs):
+        found, postcode = cache.lookup(latitude, longitude)
+        if fsa == '':
+            assert not found  # Asked about again next run, not cached as "no postcode"
+        else:
+            assert found and postcode == grid_postcode(latitude, longitude)
+    cache.close()
@@ -0,0 +1,273 @@
+"""
+Time-series mode: instead of one DineSafe dump and one ICES edition, process a whole folder of
+dated snapshots and keep every metric for every (period, FSA) pair. The snapshots folder holds
+one subfolder per period, named so they sort in time order (e.g. 2021-11, 2021-12, ...), each with
+a DineSafe file (*.xml) and/or an ICES workbook (*.xlsx):
+
+    snapshots/
+        2021-11/ds.xml
+        2021-11/ICES-COVID19-Vaccination-Data-by-FSA.xlsx
+        2021-12/ds.xml
+        ...
+
+    python time_series.py --snapshots snapshots --store time_series
+
+Periods are parsed in parallel worker processes, and only periods that aren't in the store yet
+get processed, so adding this month's snapshot only costs one month's work. The store keeps one
+file per period on disk, so adding a month only writes that month, and stacks them into one
+(periods, FSAs) array per metric when read, so a metric over time is just a slice of an array.
+"""
+import argparse  # Library for reading command line options
+from concurrent.futures import ProcessPoolExecutor  # Library for processing periods in parallel
+import glob  # Library for finding the files in each snapshot folder
+import json  # Library for reading the store's index
+import os  # Library for working with files and directories
+import numpy as np  # Library for storing the metrics as arrays
+from FSA import FSATable, FSA_COLUMNS
+from ices import read_ices_workbook
+from stage_cache import write_json
+import data_prep
+
+DEFAULT_STORE_DIR = 'time_series'
+
+# The metrics kept for every period, in the order they are stored.
+DINESAFE_METRICS = ['number_of_restaurants', 'number_of_minor_infractions',
+                    'number_of_significant_infractions', 'number_of_crucial_infractions']
+ICES_METRICS = {  # Maps each metric to its column name in ices.py
+    'total_covid_cases_per_100': 'cases_per_100',
+    'total_covid_hospitalizations_per_1000': 'hospitalizations_per_1000',
+    'total_covid_deaths_per_1000': 'deaths_per_1000',
+    'percent_1_dose': 'percent_1_dose',
+    'percent_2_doses': 'percent_2_doses',
+}
+METRICS = DINESAFE_METRICS + list(ICES_METRICS)
+
+
+class TimeSeriesStore:
+    """
+    Every metric for every (period, FSA) pair. On disk, each period is one .npy file in periods/,
+    holding one row per metric and one column per FSA, and index.json lists the periods and FSAs.
+    Adding a period writes its own file and rewrites the (small) index, and never touches the
+    periods already there. The FSA list only ever grows at the end, so a period written before
+    some FSAs appeared just has fewer columns. Values that are missing (a period without that data
+    set, a suppressed value, or an FSA that didn't exist yet) are NaN.
+
+    Reading a metric over time stacks every period's row into one (periods, FSAs) array the first
+    time it is needed, and keeps it for as long as the store object lives.
+    """
+    # Instance attributes:
+    # - directory: Where the store lives on disk
+    # - periods: The periods in the store, in time order
+    # - fsas: The FSAs in the store, in column order
+    directory: str
+    periods: list[str]
+    fsas: list[str]
+
+    def __init__(self, directory: str = DEFAULT_STORE_DIR) -> None:
+        self.directory = directory
+        self.periods = []
+        self.fsas = []
+        self._stacked = None
+        index_path = os.path.join(directory, 'index.json')
+        if os.path.exists(index_path):
+            with open(index_path, encoding='utf-8') as index_file:
+                index = json.load(index_file)
+            self.periods = index['periods']
+            self.fsas = index['fsas']
+        self._period_row = {period: row for row, period in enumerate(self.periods)}
+        self._fsa_column = {fsa: column for column, fsa in enumerate(self.fsas)}
+
+    def _period_path(self, period: str) -> str:
+        return os.path.join(self.directory, 'periods', period + '.npy')
+
+    def _read_period(self, period: str) -> np.ndarray:
+        """
+        Returns one period's (metrics, FSAs) array, padded with NaN for FSAs added after it was
+        written.
+        """
+        stored = np.load(self._period_path(period), mmap_mode='r')
+        values = np.full((len(METRICS), len(self.fsas)), np.nan)
+        values[:, :stored.shape[1]] = stored
+        return values
+
+    def _write_period(self, period: str, values: np.ndarray) -> None:
+        path = self._period_path(period)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # np.save adds .npy to names that don't end in it, so the temporary name has to.
+        temporary_path = path[:-len('.npy')] + '.tmp.npy'
+        np.save(temporary_path, values)
+        os.replace(temporary_path, path)
+
+    def _write_index(self) -> None:
+        # Written last, after every period file it lists, so it never points at a missing one.
+        write_json(os.path.join(self.directory, 'index.json'),
+                   {'periods': self.periods, 'fsas': self.fsas})
+
+    def array(self, metric: str) -> np.ndarray:
+        """
+        Returns the whole (periods, FSAs) array for a metric.
+        """
+        if self._stacked is None:
+            self._stacked = np.full((len(METRICS), len(self.periods), len(self.fsas)), np.nan)
+            for row, period in enumerate(self.periods):
+                self._stacked[:, row] = self._read_period(period)
+        return self._stacked[METRICS.index(metric)]
+
+    def series(self, metric: str, fsa: str) -> np.ndarray:
+        """
+        Returns a metric for one FSA over every period.
+        """
+        return self.array(metric)[:, self._fsa_column[fsa]]
+
+    def at(self, metric: str, period: str) -> np.ndarray:
+        """
+        Returns a metric for every FSA in one period.
+        """
+        if self._stacked is not None:
+            return self._stacked[METRICS.index(metric), self._period_row[period]]
+        return self._read_period(period)[METRICS.index(metric)]
+
+    def table(self, period: str, population: dict[str, int] = None) -> FSATable:
+        """
+        Returns one period as an FSATable, so everything that works on cleaned_data.csv (like
+        analysis.correlate) works on it too. Population comes from the census, since it doesn't
+        change between snapshots. FSAs with no DineSafe data in the period get 0 restaurants.
+        """
+        population = population or {}
+        values = self._read_period(period)
+        columns = {}
+        for column_name, _, dtype in FSA_COLUMNS:
+            if column_name == 'population':
+                columns[column_name] = [population.get(fsa, 0) for fsa in self.fsas]
+            elif dtype is np.int64:
+                columns[column_name] = np.nan_to_num(values[METRICS.index(column_name)])
+            else:
+                columns[column_name] = values[METRICS.index(column_name)]
+        return FSATable(self.fsas, columns)
+
+    def add_periods(self, new_periods: dict[str, dict[str, dict[str, float]]]) -> None:
+        """
+        Adds new periods to the store and writes them to disk. new_periods maps each period to
+        {metric: {FSA: value}}. Only the new periods' files and the index are written; existing
+        periods are left as they are (a period that is already there is replaced).
+        """
+        new_fsas = {fsa for metrics in new_periods.values() for values in metrics.values()
+                    for fsa in values}
+        self.fsas = self.fsas + sorted(new_fsas - set(self.fsas))
+        self._fsa_column = {fsa: column for column, fsa in enumerate(self.fsas)}
+
+        for period, metrics in new_periods.items():
+            values = np.full((len(METRICS), len(self.fsas)), np.nan)
+            for row, metric in enumerate(METRICS):
+                metric_values = metrics.get(metric, {})
+                if len(metric_values) > 0:
+                    columns = [self._fsa_column[fsa] for fsa in metric_values]
+                    values[row, columns] = list(metric_values.values())
+            self._write_period(period, values)
+
+        self.periods = sorted(set(self.periods) | set(new_periods))
+        self._period_row = {period: row for row, period in enumerate(self.periods)}
+        self._write_index()
+        self._stacked = None
+
+
+def find_periods(snapshots_dir: str) -> dict[str, dict[str, str]]:
+    """
+    Returns {period: {'dinesafe': path or None, 'ices': path or None}} for every subfolder of
+    snapshots_dir that has at least one of the two data sets.
+    """
+    periods = {}
+    for entry in sorted(os.listdir(snapshots_dir)):
+        folder = os.path.join(snapshots_dir, entry)
+        if not os.path.isdir(folder):
+            continue
+        dinesafe_files = sorted(glob.glob(os.path.join(folder, '*.xml')))
+        ices_files = sorted(glob.glob(os.path.join(folder, '*.xlsx')))
+        if len(dinesafe_files) > 0 or len(ices_files) > 0:
+            periods[entry] = {'dinesafe': dinesafe_files[0] if dinesafe_files else None,
+                              'ices': ices_files[0] if ices_files else None}
+    return periods
+
+
+def _process_period(period: str, paths: dict[str, str], boundaries_path: str,
+                    prefix: str) -> tuple[str, dict, tuple]:
+    """
+    Parses one period's snapshot. Runs inside a worker process, so it doesn't touch the network:
+    establishments the boundary polygons couldn't place are handed back for the parent to
+    geocode. Returns (period, {metric: {FSA: value}} for the ICES metrics, located
+    establishments or None).
+    """
+    metrics = {}
+    if paths['ices'] is not None:
+        columns = read_ices_workbook(paths['ices'], prefix=prefix)
+        names = [str(name) for name in columns['FSA']]
+        for metric, ices_column in ICES_METRICS.items():
+            metrics[metric] = {name: float(value) for name, value in
+                               zip(names, columns[ices_column])}
+
+    located = None
+    if paths['dinesafe'] is not None:
+        located = data_prep.locate_establishments(paths['dinesafe'], boundaries_path)
+    return period, metrics, located
+
+
+def update_store(snapshots_dir: str, store_dir: str = DEFAULT_STORE_DIR,
+                 boundaries_path: str = data_prep.BOUNDARIES_PATH, prefix: str = 'M',
+                 workers: int = None) -> TimeSeriesStore:
+    """
+    Processes every period in snapshots_dir that isn't in the store yet, adds them to the store,
+    and returns it. Only FSAs starting with prefix are kept ('' keeps everything).
+    """
+    store = TimeSeriesStore(store_dir)
+    new_periods = {period: paths for period, paths in find_periods(snapshots_dir).items()
+                   if period not in store.periods}
+    print(f'{len(new_periods)} new periods to process '
+          f'({len(store.periods)} already in the store)')
+    if len(new_periods) == 0:
+        return store
+
+    jobs = [(period, paths, boundaries_path, prefix) for period, paths in new_periods.items()]
+    if workers == 1 or len(jobs) == 1:
+        parsed = [_process_period(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(_process_period, *zip(*jobs)))
+
+    results = {}
+    for period, metrics, located in parsed:
+        if located is not None:
+            # Geocoding happens back here, one period at a time, so the rate limit and the
+            # geocode cache are shared properly between periods.
+            latitudes, longitudes, infractions, FSAs = located
+            if data_prep.geocode_missing_FSAs(latitudes, longitudes, FSAs) > 0:
+                # The store never redoes a period, so don't add one with establishments missing.
+                print(f'{period}: some coordinates got no answer from the geocoder, so it is '
+                      f'left out until the next update')
+                continue
+            counts = data_prep.tally_establishments(FSAs, infractions)
+            for i, metric in enumerate(DINESAFE_METRICS):
+                metrics[metric] = {name: float(count[i]) for name, count in counts.items()
+                                   if name.startswith(prefix)}
+        results[period] = metrics
+
+    if len(results) > 0:
+        store.add_periods(results)
+    return store
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Add new dated snapshots to the time series '
+                                                 'store.')
+    parser.add_argument('--snapshots', default='snapshots',
+                        help='folder with one subfolder of data per period')
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help='where the store lives')
+    parser.add_argument('--boundaries', default=data_prep.BOUNDARIES_PATH,
+                        help='FSA boundary GeoJSON file')
+    parser.add_argument('--prefix', default='M', help="only keep FSAs starting with this ('' "
+                                                      "for all)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: one per core)')
+    args = parser.parse_args()
+
+    result = update_store(args.snapshots, args.store, args.boundaries, args.prefix, args.workers)
+    print(f'Store now has {len(result.periods)} periods and {len(result.fsas)} FSAs')